@@ -1,5 +1,4 @@
-from io import BytesIO
-from LtMAO.binstream import BinStream
+from LtMAO.binstream import BinStream, BinReader, BinWriter, Matrix4, STRUCTS_U16, STRUCTS_U32
 from enum import Enum
 
 
@@ -23,6 +22,8 @@ def name_to_hash(name):
 
 
 def hex_to_name(hashtables, table_name, hash):
+    if isinstance(hash, int):
+        return hashtables.get(table_name, {}).get(hash_to_hex(hash), hash)
     return hashtables.get(table_name, {}).get(hash, hash)
 
 
@@ -30,7 +31,13 @@ def name_to_hex(name):
     return hash_to_hex(name_to_hash(name))
 
 
+def chunked(values, size):
+    return [values[i:i+size] for i in range(0, len(values), size)]
+
+
 def name_or_hex_to_hash(value):
+    if isinstance(value, int):
+        return value
     try:
         return hex_to_hash(value)
     except:
@@ -38,14 +45,12 @@ def name_or_hex_to_hash(value):
 
 
 class BINHelper:
-    size_offsets = []
-
     @staticmethod
     def fix_type(bin_type, legacy=False):
-        if legacy:
-            if bin_type >= 129:
-                bin_type += 1
-        return BINType(bin_type)
+        try:
+            return (legacy_bin_types if legacy else bin_types)[bin_type]
+        except KeyError:
+            raise ValueError(f'{bin_type} is not a valid BINType')
 
     @staticmethod
     def find_item(*, items=[], compare_func=None, return_func=None):
@@ -59,87 +64,61 @@ class BINHelper:
         return None
 
     @staticmethod
-    def read_value(bs, value_type):
-        value = None
-        if value_type == BINType.Empty:
-            value = bs.read_u16(3)
-        elif value_type == BINType.Bool:
-            value = bs.read_b()[0]
-        elif value_type == BINType.I8:
-            value = bs.read_i8()[0]
-        elif value_type == BINType.U8:
-            value = bs.read_u8()[0]
-        elif value_type == BINType.I16:
-            value = bs.read_i16()[0]
-        elif value_type == BINType.U16:
-            value = bs.read_u16()[0]
-        elif value_type == BINType.I32:
-            value = bs.read_i32()[0]
-        elif value_type == BINType.U32:
-            value = bs.read_i32()[0]
-        elif value_type == BINType.I64:
-            value = bs.read_i64()[0]
-        elif value_type == BINType.U64:
-            value = bs.read_u64()[0]
-        elif value_type == BINType.F32:
-            value = bs.read_f32()[0]
-        elif value_type == BINType.Vec2:
-            value = bs.read_vec2()[0]
-        elif value_type == BINType.Vec3:
-            value = bs.read_vec3()[0]
-        elif value_type == BINType.Vec4:
-            value = bs.read_vec4()[0]
-        elif value_type == BINType.Mtx4:
-            value = bs.read_mtx4()[0]
-        elif value_type == BINType.RGBA:
-            value = bs.read_u8(4)
-        elif value_type == BINType.String:
-            size, = bs.read_u16()
-            value = bs.read_a(size)[0]
-        elif value_type == BINType.Hash:
-            value = hash_to_hex(bs.read_u32()[0])
-        elif value_type == BINType.File:
-            value = bs.read_u64()[0]
-        elif value_type == BINType.Pointer or value_type == BINType.Embed:
-            field = BINField()
-            field.hash_type = hash_to_hex(bs.read_u32()[0])
-            if field.hash_type != '00000000':
-                field.type = value_type
-                bs.pad(4)  # size
-                count, = bs.read_u16()
-                field.data = [
-                    BINHelper.read_field(bs)
-                    for i in range(count)
-                ]
-            else:
-                field.data = None
-            value = field
-        elif value_type == BINType.Link:
-            value = hash_to_hex(bs.read_u32()[0])
-        elif value_type == BINType.Flag:
-            value = bs.read_u8()[0]
-        return value
+    def read_embed(bs, value_type, int_hashes=False):
+        field = BINField()
+        field.offset = bs.tell()
+        hash_type, = bs.read_u32()
+        field.hash_type = hash_type if int_hashes else hash_to_hex(
+            hash_type)
+        if hash_type != 0:
+            field.type = value_type
+            bs.pad(4)  # size
+            count, = bs.read_u16()
+            field.data = [
+                BINHelper.read_field(bs, int_hashes)
+                for i in range(count)
+            ]
+        else:
+            field.data = None
+        return field
 
     @staticmethod
-    def read_field(bs):
+    def read_value(bs, value_type, int_hashes=False):
+        # int_hashes: keep hashes as int instead of hex string
+        readers = int_value_readers if int_hashes else value_readers
+        return readers[value_type](bs)
+
+    @staticmethod
+    def read_field(bs, int_hashes=False):
         field = BINField()
-        field.hash = hash_to_hex(bs.read_u32()[0])
+        field.offset = bs.tell()
+        field.hash, = bs.read_u32()
+        if not int_hashes:
+            field.hash = hash_to_hex(field.hash)
         field.type = BINHelper.fix_type(bs.read_u8()[0])
-        if field.type == BINType.List or field.type == BINType.List2:
+        readers = int_value_readers if int_hashes else value_readers
+        if field.type.value < 128 or field.type == BINType.Link or field.type == BINType.Flag:
+            field.data = readers[field.type](bs)
+        elif field.type == BINType.List or field.type == BINType.List2:
             field.value_type = BINHelper.fix_type(bs.read_u8()[0])
             bs.pad(4)  # size
             count, = bs.read_u32()
-            field.data = [
-                BINHelper.read_value(bs, field.value_type)
-                for i in range(count)
-            ]
+            read_list = (
+                int_list_readers if int_hashes else list_readers).get(field.value_type)
+            if read_list != None:
+                field.data = read_list(bs, count)
+            else:
+                read = readers[field.value_type]
+                field.data = [read(bs) for i in range(count)]
         elif field.type == BINType.Pointer or field.type == BINType.Embed:
-            field.hash_type = hash_to_hex(bs.read_u32()[0])
-            if field.hash_type != '00000000':
+            hash_type, = bs.read_u32()
+            field.hash_type = hash_type if int_hashes else hash_to_hex(
+                hash_type)
+            if hash_type != 0:
                 bs.pad(4)  # size
                 count, = bs.read_u16()
                 field.data = [
-                    BINHelper.read_field(bs)
+                    BINHelper.read_field(bs, int_hashes)
                     for i in range(count)
                 ]
             else:
@@ -148,7 +127,7 @@ class BINHelper:
             field.value_type = BINHelper.fix_type(bs.read_u8()[0])
             count, = bs.read_u8()
             if count != 0:
-                field.data = BINHelper.read_value(bs, field.value_type)
+                field.data = readers[field.value_type](bs)
             else:
                 field.data = None
         elif field.type == BINType.Map:
@@ -156,144 +135,81 @@ class BINHelper:
             field.value_type = BINHelper.fix_type(bs.read_u8()[0])
             bs.pad(4)  # size
             count, = bs.read_u32()
+            read_key = readers[field.key_type]
+            read_value = readers[field.value_type]
             field.data = {
-                BINHelper.read_value(bs, field.key_type): BINHelper.read_value(bs, field.value_type)
+                read_key(bs): read_value(bs)
                 for i in range(count)
             }
-        else:
-            field.data = BINHelper.read_value(bs, field.type)
         return field
 
     @staticmethod
-    def write_value(bs, value, value_type, header_size):
-        value_size = 5 if header_size else 0
-        if value_type == BINType.Empty:
-            bs.write_u16(*value)
-        elif value_type == BINType.Bool:
-            bs.write_b(value)
-            value_size += 1
-        elif value_type == BINType.I8:
-            bs.write_i8(value)
-            value_size += 1
-        elif value_type == BINType.U8:
-            bs.write_u8(value)
-            value_size += 1
-        elif value_type == BINType.I16:
-            bs.write_i16(value)
-            value_size += 2
-        elif value_type == BINType.U16:
-            bs.write_u16(value)
-            value_size += 2
-        elif value_type == BINType.I32:
-            bs.write_i32(value)
-            value_size += 4
-        elif value_type == BINType.U32:
-            bs.write_u32(value)
-            value_size += 4
-        elif value_type == BINType.I64:
-            bs.write_i64(value)
-            value_size += 8
-        elif value_type == BINType.U64:
-            bs.write_u64(value)
-            value_size += 8
-        elif value_type == BINType.F32:
-            bs.write_f32(value)
-            value_size += 4
-        elif value_type == BINType.Vec2:
-            bs.write_vec2(value)
-            value_size += 8
-        elif value_type == BINType.Vec3:
-            bs.write_vec3(value)
-            value_size += 12
-        elif value_type == BINType.Vec4:
-            bs.write_vec4(value)
-            value_size += 16
-        elif value_type == BINType.Mtx4:
-            bs.write_mtx4(value)
-            value_size += 64
-        elif value_type == BINType.RGBA:
-            bs.write_u8(*value)
-            value_size += 4
-        elif value_type == BINType.String:
-            size = len(value)
-            bs.write_u16(size)
-            bs.write_a(value)
-            value_size += size + 2
-        elif value_type == BINType.Hash:
-            bs.write_u32(name_or_hex_to_hash(value))
-            value_size += 4
-        elif value_type == BINType.File:
-            bs.write_u64(value)
-            value_size += 8
-        elif value_type == BINType.Pointer or value_type == BINType.Embed:
-            field = value  # treat the value as BINField
-            if field.hash_type == '00000000':
-                bs.write_u32(0)
-                value_size += 4
-            else:
-                bs.write_u32(name_or_hex_to_hash(field.hash_type))
-                value_size += 4
+    def write_string(bs, value):
+        # returns the written size
+        bs.write_u16(len(value))
+        bs.write_a(value)
+        return len(value) + 2
 
-                return_offset = bs.tell()
-                bs.write_u32(0)  # size
-                value_size += 4
+    @staticmethod
+    def write_embed(bs, field):
+        # returns the written size
+        hash_type = name_or_hex_to_hash(field.hash_type)
+        if hash_type == 0:
+            bs.write_u32(0)  # hash_type
+            return 4
+        bs.write_u32(hash_type)
+        size_slot = bs.reserve_u32()  # values size
+        content_size = 2
+        bs.write_u16(len(field.data))
+        for value in field.data:
+            content_size += BINHelper.write_field(
+                bs, value, header_size=True)
+        bs.fill_u32(size_slot, content_size)
+        return 4 + 4 + content_size
 
-                content_size = 2
-                bs.write_u16(len(field.data))
-                for value in field.data:
-                    content_size += BINHelper.write_field(
-                        bs, value, header_size=True)
-                BINHelper.size_offsets.append((return_offset, content_size))
-
-                value_size += content_size
-        elif value_type == BINType.Link:
-            bs.write_u32(name_or_hex_to_hash(value))
-            value_size += 4
-        elif value_type == BINType.Flag:
-            bs.write_u8(value)
-            value_size += 1
-        return value_size
+    @staticmethod
+    def write_value(bs, value, value_type, header_size):
+        value_size = value_sizes[value_type]
+        if value_size == None:
+            value_size = value_writers[value_type](bs, value)
+        else:
+            value_writers[value_type](bs, value)
+        return value_size + 5 if header_size else value_size
 
     @staticmethod
     def write_field(bs, field, header_size):
         field_size = 5 if header_size else 0
         bs.write_u32(name_or_hex_to_hash(field.hash))
         bs.write_u8(field.type.value)
-        if field.type == BINType.List or field.type == BINType.List2:
+        if field.type.value < 128 or field.type == BINType.Link or field.type == BINType.Flag:
+            field_size += BINHelper.write_value(bs,
+                                                field.data, field.type, header_size=False)
+        elif field.type == BINType.List or field.type == BINType.List2:
             bs.write_u8(field.value_type.value)
 
-            return_offset = bs.tell()
-            bs.write_u32(0)  # values size
+            size_slot = bs.reserve_u32()  # values size
             field_size += 1 + 4
 
             content_size = 4
             bs.write_u32(len(field.data))
-            for value in field.data:
-                content_size += BINHelper.write_value(bs,
-                                                      value, field.value_type, header_size=False)
-            BINHelper.size_offsets.append((return_offset, content_size))
-
-            field_size += content_size
-        elif field.type == BINType.Pointer or field.type == BINType.Embed:
-            if field.hash_type == '00000000':
-                bs.write_u32(0)  # hash_type
-                field_size += 4
+            write_list = list_writers.get(field.value_type)
+            write = value_writers[field.value_type]
+            value_size = value_sizes[field.value_type]
+            if write_list != None:
+                write_list(bs, field.data)
+                content_size += value_size * len(field.data)
+            elif value_size == None:
+                for value in field.data:
+                    content_size += write(bs, value)
             else:
-                bs.write_u32(name_or_hex_to_hash(field.hash_type))
-                field_size += 4
-
-                return_offset = bs.tell()
-                bs.write_u32(0)  # values size
-                field_size += 4
-
-                content_size = 2
-                bs.write_u16(len(field.data))
                 for value in field.data:
-                    content_size += BINHelper.write_field(
-                        bs, value, header_size=True)
-                BINHelper.size_offsets.append((return_offset, content_size))
+                    write(bs, value)
+                content_size += value_size * len(field.data)
+            bs.fill_u32(size_slot, content_size)
 
-                field_size += content_size
+            field_size += content_size
+        elif field.type == BINType.Pointer or field.type == BINType.Embed:
+            field_size += BINHelper.write_embed(bs, field)
         elif field.type == BINType.Option:
             bs.write_u8(field.value_type.value)
             count = 0 if field.data == None else 1
@@ -308,8 +224,7 @@ class BINHelper:
                 field.value_type.value
             )
 
-            return_offset = bs.tell()
-            bs.write_u32(0)  # size
+            size_slot = bs.reserve_u32()  # size
             field_size += 1+1+4
 
             content_size = 4
@@ -319,12 +234,9 @@ class BINHelper:
                                                       key, field.key_type, header_size=False)
                 content_size += BINHelper.write_value(bs,
                                                       value, field.value_type, header_size=False)
-            BINHelper.size_offsets.append((return_offset, content_size))
+            bs.fill_u32(size_slot, content_size)
 
             field_size += content_size
-        else:
-            field_size += BINHelper.write_value(bs,
-                                                field.data, field.type, header_size=False)
         return field_size
 
 
@@ -363,8 +275,169 @@ class BINType(Enum):
         return self.name
 
 
+# raw type byte -> BINType, legacy bins dont have List2
+bin_types = {bin_type.value: bin_type for bin_type in BINType}
+legacy_bin_types = {
+    bin_type.value - 1 if bin_type.value >= 130 else bin_type.value: bin_type
+    for bin_type in BINType if bin_type != BINType.List2
+}
+
+# BINType -> value reader
+# complex types are not values, they read as None
+value_readers = {
+    BINType.Empty: lambda bs: bs.read_u16(3),
+    BINType.Bool: lambda bs: bs.read_b()[0],
+    BINType.I8: lambda bs: bs.read_i8()[0],
+    BINType.U8: lambda bs: bs.read_u8()[0],
+    BINType.I16: lambda bs: bs.read_i16()[0],
+    BINType.U16: lambda bs: bs.read_u16()[0],
+    BINType.I32: lambda bs: bs.read_i32()[0],
+    BINType.U32: lambda bs: bs.read_i32()[0],
+    BINType.I64: lambda bs: bs.read_i64()[0],
+    BINType.U64: lambda bs: bs.read_u64()[0],
+    BINType.F32: lambda bs: bs.read_f32()[0],
+    BINType.Vec2: lambda bs: bs.read_vec2()[0],
+    BINType.Vec3: lambda bs: bs.read_vec3()[0],
+    BINType.Vec4: lambda bs: bs.read_vec4()[0],
+    BINType.Mtx4: lambda bs: bs.read_mtx4()[0],
+    BINType.RGBA: lambda bs: bs.read_u8(4),
+    BINType.String: lambda bs: bs.read_a(bs.read_u16()[0])[0],
+    BINType.Hash: lambda bs: hash_to_hex(bs.read_u32()[0]),
+    BINType.File: lambda bs: bs.read_u64()[0],
+    BINType.List: lambda bs: None,
+    BINType.List2: lambda bs: None,
+    BINType.Pointer: lambda bs: BINHelper.read_embed(bs, BINType.Pointer),
+    BINType.Embed: lambda bs: BINHelper.read_embed(bs, BINType.Embed),
+    BINType.Link: lambda bs: hash_to_hex(bs.read_u32()[0]),
+    BINType.Option: lambda bs: None,
+    BINType.Map: lambda bs: None,
+    BINType.Flag: lambda bs: bs.read_u8()[0],
+}
+int_value_readers = dict(value_readers)
+int_value_readers.update({
+    BINType.Hash: lambda bs: bs.read_u32()[0],
+    BINType.Pointer: lambda bs: BINHelper.read_embed(bs, BINType.Pointer, True),
+    BINType.Embed: lambda bs: BINHelper.read_embed(bs, BINType.Embed, True),
+    BINType.Link: lambda bs: bs.read_u32()[0],
+})
+
+# BINType -> value writer, and its size
+# None size: the writer returns the size it wrote
+value_writers = {
+    BINType.Empty: lambda bs, value: bs.write_u16(*value),
+    BINType.Bool: lambda bs, value: bs.write_b(value),
+    BINType.I8: lambda bs, value: bs.write_i8(value),
+    BINType.U8: lambda bs, value: bs.write_u8(value),
+    BINType.I16: lambda bs, value: bs.write_i16(value),
+    BINType.U16: lambda bs, value: bs.write_u16(value),
+    BINType.I32: lambda bs, value: bs.write_i32(value),
+    BINType.U32: lambda bs, value: bs.write_u32(value),
+    BINType.I64: lambda bs, value: bs.write_i64(value),
+    BINType.U64: lambda bs, value: bs.write_u64(value),
+    BINType.F32: lambda bs, value: bs.write_f32(value),
+    BINType.Vec2: lambda bs, value: bs.write_vec2(value),
+    BINType.Vec3: lambda bs, value: bs.write_vec3(value),
+    BINType.Vec4: lambda bs, value: bs.write_vec4(value),
+    BINType.Mtx4: lambda bs, value: bs.write_mtx4(value),
+    BINType.RGBA: lambda bs, value: bs.write_u8(*value),
+    BINType.String: lambda bs, value: BINHelper.write_string(bs, value),
+    BINType.Hash: lambda bs, value: bs.write_u32(name_or_hex_to_hash(value)),
+    BINType.File: lambda bs, value: bs.write_u64(value),
+    BINType.List: lambda bs, value: None,
+    BINType.List2: lambda bs, value: None,
+    BINType.Pointer: lambda bs, value: BINHelper.write_embed(bs, value),
+    BINType.Embed: lambda bs, value: BINHelper.write_embed(bs, value),
+    BINType.Link: lambda bs, value: bs.write_u32(name_or_hex_to_hash(value)),
+    BINType.Option: lambda bs, value: None,
+    BINType.Map: lambda bs, value: None,
+    BINType.Flag: lambda bs, value: bs.write_u8(value),
+}
+value_sizes = {
+    BINType.Empty: 0,
+    BINType.Bool: 1,
+    BINType.I8: 1,
+    BINType.U8: 1,
+    BINType.I16: 2,
+    BINType.U16: 2,
+    BINType.I32: 4,
+    BINType.U32: 4,
+    BINType.I64: 8,
+    BINType.U64: 8,
+    BINType.F32: 4,
+    BINType.Vec2: 8,
+    BINType.Vec3: 12,
+    BINType.Vec4: 16,
+    BINType.Mtx4: 64,
+    BINType.RGBA: 4,
+    BINType.String: None,
+    BINType.Hash: 4,
+    BINType.File: 8,
+    BINType.List: 0,
+    BINType.List2: 0,
+    BINType.Pointer: None,
+    BINType.Embed: None,
+    BINType.Link: 4,
+    BINType.Option: 0,
+    BINType.Map: 0,
+    BINType.Flag: 1,
+}
+
+
+# BINType -> bulk reader/writer for lists of fixed size values,
+# one unpack/pack for the whole list
+list_readers = {
+    BINType.Empty: lambda bs, count: chunked(bs.read_u16(count*3), 3),
+    BINType.Bool: lambda bs, count: list(bs.read_b(count)),
+    BINType.I8: lambda bs, count: list(bs.read_i8(count)),
+    BINType.U8: lambda bs, count: list(bs.read_u8(count)),
+    BINType.I16: lambda bs, count: list(bs.read_i16(count)),
+    BINType.U16: lambda bs, count: list(bs.read_u16(count)),
+    BINType.I32: lambda bs, count: list(bs.read_i32(count)),
+    BINType.U32: lambda bs, count: list(bs.read_i32(count)),
+    BINType.I64: lambda bs, count: list(bs.read_i64(count)),
+    BINType.U64: lambda bs, count: list(bs.read_u64(count)),
+    BINType.F32: lambda bs, count: list(bs.read_f32(count)),
+    BINType.Vec2: lambda bs, count: bs.read_vec2(count),
+    BINType.Vec3: lambda bs, count: bs.read_vec3(count),
+    BINType.Vec4: lambda bs, count: bs.read_vec4(count),
+    BINType.Mtx4: lambda bs, count: [Matrix4(*values) for values in chunked(bs.read_f32(count*16), 16)],
+    BINType.RGBA: lambda bs, count: chunked(bs.read_u8(count*4), 4),
+    BINType.Hash: lambda bs, count: [hash_to_hex(value) for value in bs.read_u32(count)],
+    BINType.File: lambda bs, count: list(bs.read_u64(count)),
+    BINType.Link: lambda bs, count: [hash_to_hex(value) for value in bs.read_u32(count)],
+    BINType.Flag: lambda bs, count: list(bs.read_u8(count)),
+}
+int_list_readers = dict(list_readers)
+int_list_readers.update({
+    BINType.Hash: lambda bs, count: list(bs.read_u32(count)),
+    BINType.Link: lambda bs, count: list(bs.read_u32(count)),
+})
+list_writers = {
+    BINType.Empty: lambda bs, values: bs.write_u16(*(v for value in values for v in value)),
+    BINType.Bool: lambda bs, values: bs.write_b(*values),
+    BINType.I8: lambda bs, values: bs.write_i8(*values),
+    BINType.U8: lambda bs, values: bs.write_u8(*values),
+    BINType.I16: lambda bs, values: bs.write_i16(*values),
+    BINType.U16: lambda bs, values: bs.write_u16(*values),
+    BINType.I32: lambda bs, values: bs.write_i32(*values),
+    BINType.U32: lambda bs, values: bs.write_u32(*values),
+    BINType.I64: lambda bs, values: bs.write_i64(*values),
+    BINType.U64: lambda bs, values: bs.write_u64(*values),
+    BINType.F32: lambda bs, values: bs.write_f32(*values),
+    BINType.Vec2: lambda bs, values: bs.write_vec2(*values),
+    BINType.Vec3: lambda bs, values: bs.write_vec3(*values),
+    BINType.Vec4: lambda bs, values: bs.write_vec4(*values),
+    BINType.Mtx4: lambda bs, values: bs.write_f32(*(v for value in values for v in value)),
+    BINType.RGBA: lambda bs, values: bs.write_u8(*(v for value in values for v in value)),
+    BINType.Hash: lambda bs, values: bs.write_u32(*(name_or_hex_to_hash(value) for value in values)),
+    BINType.File: lambda bs, values: bs.write_u64(*values),
+    BINType.Link: lambda bs, values: bs.write_u32(*(name_or_hex_to_hash(value) for value in values)),
+    BINType.Flag: lambda bs, values: bs.write_u8(*values),
+}
+
 class BINField:
-    __slots__ = ('hash', 'type', 'hash_type', 'key_type', 'value_type', 'data')
+    __slots__ = ('hash', 'type', 'hash_type',
+                 'key_type', 'value_type', 'data', 'offset')
 
     def __init__(self):
         self.hash = None
@@ -373,9 +446,11 @@ class BINField:
         self.key_type = None
         self.value_type = None
         self.data = []
+        self.offset = None  # file offset, set by BIN.read
 
     def __json__(self):
-        dic = {key: getattr(self, key) for key in self.__slots__}
+        dic = {key: getattr(self, key)
+               for key in self.__slots__ if key != 'offset'}
         if self.type == BINType.List or self.type == BINType.List2:
             dic.pop('key_type')
             dic.pop('hash_type')
@@ -405,15 +480,37 @@ class BINPatch:
 
 
 class BINEntry:
-    __slots__ = ('hash', 'type', 'data')
+    __slots__ = ('hash', 'type', 'offset', 'raw', '_data', '_int_hashes')
 
     def __init__(self):
         self.hash = None
         self.type = None
-        self.data = []
+        self.offset = None  # file offset of the size, set by BIN.read
+        self.raw = None  # undecoded fields of a lazy entry
+        self._data = []
+        self._int_hashes = False
+
+    @property
+    def data(self):
+        if self.raw != None:
+            self.decode()
+        return self._data
+
+    @data.setter
+    def data(self, data):
+        self.raw = None
+        self._data = data
+
+    def decode(self):
+        # raw starts after size and hash
+        with BinReader(self.raw, self.offset + 8) as bs:
+            field_count, = bs.read_u16()
+            self._data = [BINHelper.read_field(
+                bs, self._int_hashes) for i in range(field_count)]
+        self.raw = None
 
     def __json__(self):
-        return {key: getattr(self, key) for key in self.__slots__}
+        return {'hash': self.hash, 'type': self.type, 'data': self.data}
 
 
 class BIN:
@@ -433,16 +530,31 @@ class BIN:
     def __json__(self):
         return {key: getattr(self, key) for key in self.__slots__}
 
-    def stream(self, path, mode, raw=None):
+    def stream(self, path, mode, raw=None, mapped=False):
         if raw != None:
             if raw == True:  # the bool True value
-                return BinStream(BytesIO())
+                return BinWriter()
+            elif 'w' in mode or '+' in mode:
+                return BinWriter(raw)
             else:
-                return BinStream(BytesIO(raw))
+                return BinReader(raw)
+        if mapped and mode == 'rb':
+            return BinReader.map_file(path)
+        if mode == 'rb':
+            # bins are small enough to parse from memory
+            with open(path, 'rb') as f:
+                return BinReader(f.read())
+        if mode == 'wb':
+            # build in memory, written to path on close
+            return BinWriter(path=path)
         return BinStream(open(path, mode))
 
-    def read(self, path, raw=None):
-        with self.stream(path, 'rb', raw) as bs:
+    def read(self, path, raw=None, mapped=False, lazy=False, types=None, int_hashes=False):
+        # lazy: keep entries as raw bytes until their data is accessed
+        # types: entry types that are still decoded right away in lazy mode
+        # int_hashes: keep all hashes as int, hex strings only on un_hash
+        types = set(types) if types != None else ()
+        with self.stream(path, 'rb', raw, mapped) as bs:
             # header
             self.signature, = bs.read_a(4)
             if self.signature not in ('PROP', 'PTCH'):
@@ -469,23 +581,85 @@ class BIN:
             entry_types = bs.read_u32(entry_count)
             self.entries = [BINEntry() for i in range(entry_count)]
             for entry_id, entry in enumerate(self.entries):
-                entry.type = hash_to_hex(entry_types[entry_id])
-                bs.pad(4)  # size
-                entry.hash = hash_to_hex(bs.read_u32()[0])
-
+                entry.type = entry_types[entry_id]
+                entry.offset = bs.tell()
+                entry_size, entry.hash = bs.read_u32(2)
+                if not int_hashes:
+                    entry.type = hash_to_hex(entry.type)
+                    entry.hash = hash_to_hex(entry.hash)
+
+                if lazy and entry.type not in types:
+                    entry.raw = bs.read(entry_size - 4)
+                    entry._int_hashes = int_hashes
+                    continue
                 field_count, = bs.read_u16()
                 entry.data = [BINHelper.read_field(
-                    bs) for i in range(field_count)]
+                    bs, int_hashes) for i in range(field_count)]
             # patches
             if self.is_patch and self.version >= 3:
                 patch_count, = bs.read_u32()
                 self.patches = [BINPatch() for i in range(patch_count)]
                 for patch in self.patches:
-                    patch.hash = hash_to_hex(bs.read_u32()[0])
+                    patch.hash, = bs.read_u32()
+                    if not int_hashes:
+                        patch.hash = hash_to_hex(patch.hash)
                     bs.pad(4)  # size
                     patch.type = BINHelper.fix_type(bs.read_u8()[0])
                     patch.path, = bs.read_a(bs.read_u16()[0])
-                    patch.data = BINHelper.read_value(bs, patch.type)
+                    patch.data = BINHelper.read_value(
+                        bs, patch.type, int_hashes)
+
+    @staticmethod
+    def find_entries(raw, types, int_hashes=False):
+        # lazy entries of these int types, found in the raw bin bytes
+        # with a search of the entry type table, the other entries are skipped by their size
+        with BinReader(raw) as bs:
+            signature, = bs.read_a(4)
+            if signature == 'PTCH':
+                bs.pad(8)  # patch header
+                signature, = bs.read_a(4)
+            if signature != 'PROP':
+                raise Exception(
+                    f'pyRitoFile: Failed: Find BIN entries: Wrong file signature: {signature}')
+            version, = bs.read_u32()
+            if version >= 2:
+                link_count, = bs.read_u32()
+                for i in range(link_count):
+                    bs.pad(bs.read_u16()[0])
+            entry_count, = bs.read_u32()
+            types_start = bs.tell()
+            types_end = types_start + entry_count * 4
+            # entry ids of the types, matches not aligned to the table are not types
+            entry_ids = set()
+            for entry_type in types:
+                pattern = STRUCTS_U32[1].pack(entry_type)
+                pos = raw.find(pattern, types_start, types_end)
+                while pos != -1:
+                    if (pos - types_start) % 4 == 0:
+                        entry_ids.add((pos - types_start) // 4)
+                    pos = raw.find(pattern, pos + 1, types_end)
+            entries = []
+            if not entry_ids:
+                return entries
+            bs.seek(types_end)
+            for entry_id in range(max(entry_ids) + 1):
+                entry_offset = bs.tell()
+                entry_size, = bs.read_u32()
+                if entry_id not in entry_ids:
+                    bs.pad(entry_size)
+                    continue
+                entry = BINEntry()
+                entry.offset = entry_offset
+                entry.type, = STRUCTS_U32[1].unpack_from(
+                    raw, types_start + entry_id * 4)
+                entry.hash, = bs.read_u32()
+                if not int_hashes:
+                    entry.type = hash_to_hex(entry.type)
+                    entry.hash = hash_to_hex(entry.hash)
+                entry.raw = bs.read(entry_size - 4)
+                entry._int_hashes = int_hashes
+                entries.append(entry)
+            return entries
 
     def write(self, path, raw=None):
         with self.stream(path, 'wb', raw) as bs:
@@ -504,11 +678,14 @@ class BIN:
             bs.write_u32(len(self.entries))
             for entry in self.entries:
                 bs.write_u32(name_or_hex_to_hash(entry.type))
-            BINHelper.size_offsets = []  # this help to write sizes
             for entry in self.entries:
-                return_offset = bs.tell()
-
-                bs.write_u32(0)  # size
+                if entry.raw != None:
+                    # untouched lazy entry, copy its bytes as is
+                    bs.write_u32(4 + len(entry.raw))
+                    bs.write_u32(name_or_hex_to_hash(entry.hash))
+                    bs.write(entry.raw)
+                    continue
+                size_slot = bs.reserve_u32()  # size
                 entry_size = 4+2
 
                 bs.write_u32(name_or_hex_to_hash(entry.hash))
@@ -516,28 +693,22 @@ class BIN:
                 for field in entry.data:
                     entry_size += BINHelper.write_field(
                         bs, field, header_size=True)
-                BINHelper.size_offsets.append((return_offset, entry_size))
+                bs.fill_u32(size_slot, entry_size)
             # patches
             if self.is_patch:
                 bs.write_u32(len(self.patches))
                 for patch in self.patches:
-                    bs.write_u32(name_or_hex_to_hash(path.hash))
+                    bs.write_u32(name_or_hex_to_hash(patch.hash))
 
-                    return_offset = bs.tell()
-                    bs.write_u32(0)  # size
+                    size_slot = bs.reserve_u32()  # size
                     patch_size = 1 + 2 + len(patch.path)
 
                     bs.write_u8(patch.type.value)
                     bs.write_u16(len(patch.path))
                     bs.write_a(patch.path)
                     patch_size += BINHelper.write_value(
-                        bs, patch.type, header_size=False)
-                    BINHelper.size_offsets.append(
-                        (return_offset, patch_size))
-            # jump around and write size
-            for offset, size in BINHelper.size_offsets:
-                bs.seek(offset)
-                bs.write_u32(size)
+                        bs, patch.data, patch.type, header_size=False)
+                    bs.fill_u32(size_slot, patch_size)
             return bs.raw() if raw else None
 
     def un_hash(self, hashtables=None):
@@ -552,7 +723,7 @@ class BIN:
             elif value_type in (BINType.List, BINType.List2):
                 value.data = [un_hash_value(v, value_type) for v in value.data]
             elif value_type in (BINType.Embed, BINType.Pointer):
-                if value.hash_type != '00000000':
+                if value.data != None:
                     value.hash_type = hex_to_name(
                         hashtables, 'hashes.bintypes.txt',  value.hash_type)
                     for f in value.data:
@@ -570,7 +741,7 @@ class BIN:
                 field.data = [un_hash_value(v, field.value_type)
                               for v in field.data]
             elif field.type in (BINType.Embed, BINType.Pointer):
-                if field.hash_type != '00000000':
+                if field.data != None:
                     field.hash_type = hex_to_name(
                         hashtables, 'hashes.bintypes.txt', field.hash_type)
                     for f in field.data:
@@ -593,3 +764,123 @@ class BIN:
                 hashtables, 'hashes.bintypes.txt', entry.type)
             for field in entry.data:
                 un_hash_field(field)
+
+
+class BINEditor:
+    # edit a BIN as byte splices on the buffer it was read from,
+    # using the offsets recorded by BIN.read, instead of writing the whole file
+    # edits also go into the BIN tree, apply() gives the same bytes as BIN.write
+    __slots__ = ('bin', 'raw', 'values', 'appends')
+
+    def __init__(self, bin_file, raw):
+        self.bin = bin_file
+        self.raw = raw
+        self.values = {}  # value offset: (old size, field, containers)
+        self.appends = []  # (field, containers)
+
+    @staticmethod
+    def size_offset(container):
+        if isinstance(container, BINEntry):
+            return container.offset
+        # field header: hash + type, embeds inside lists dont have one
+        offset = container.offset + (5 if container.hash != None else 0)
+        if container.type in (BINType.Pointer, BINType.Embed):
+            return offset + 4  # hash_type
+        elif container.type in (BINType.List, BINType.List2):
+            return offset + 1  # value_type
+        elif container.type == BINType.Map:
+            return offset + 2  # key_type + value_type
+        return None  # option has no size
+
+    @staticmethod
+    def count_offset(container):
+        if isinstance(container, BINEntry):
+            return container.offset + 8  # size + hash
+        return BINEditor.size_offset(container) + 4
+
+    def set_value(self, field, value, *containers):
+        # containers: enclosing entry and fields, outermost first,
+        # only needed when the value changes size (strings)
+        if field.type.value >= 128 and field.type not in (BINType.Link, BINType.Flag):
+            raise Exception(
+                f'pyRitoFile: Failed: Edit BIN: Can not set a {field.type} value in place.')
+        if field.offset != None:
+            value_offset = field.offset + 5
+            if value_offset not in self.values:
+                with BinWriter() as bs:
+                    BINHelper.write_value(
+                        bs, field.data, field.type, header_size=False)
+                    old_size = bs.end()
+                self.values[value_offset] = (old_size, field, containers)
+        field.data = value
+
+    def append_field(self, field, *containers):
+        # containers: enclosing entry and fields, outermost first,
+        # the field is appended to the last one
+        container = containers[-1]
+        if not isinstance(container, BINEntry) and (container.type not in (BINType.Pointer, BINType.Embed) or container.data == None):
+            raise Exception(
+                f'pyRitoFile: Failed: Edit BIN: Can not append fields to a {container.type}.')
+        container.data.append(field)
+        if container.offset != None:
+            # containers that are not in the file yet get written whole
+            self.appends.append((field, containers))
+
+    def apply(self):
+        if self.bin.is_patch or self.bin.version != 3:
+            # BIN.write upgrades those, nothing to splice onto
+            return self.bin.write('', raw=True)
+        raw = self.raw
+        splices = []  # (offset, old size, depth, new bytes)
+        size_deltas = {}
+        count_deltas = {}
+
+        def grow(containers, delta):
+            for container in containers:
+                size_offset = self.size_offset(container)
+                if size_offset != None:
+                    size_deltas[size_offset] = size_deltas.get(
+                        size_offset, 0) + delta
+
+        for value_offset, (old_size, field, containers) in self.values.items():
+            with BinWriter() as bs:
+                BINHelper.write_value(
+                    bs, field.data, field.type, header_size=False)
+                data = bs.raw()
+            if len(data) != old_size:
+                if len(containers) == 0:
+                    raise Exception(
+                        f'pyRitoFile: Failed: Edit BIN: Value at {value_offset} changed size without its containers.')
+                grow(containers, len(data) - old_size)
+            splices.append((value_offset, old_size, 0, data))
+        for field, containers in self.appends:
+            with BinWriter() as bs:
+                BINHelper.write_field(bs, field, header_size=True)
+                data = bs.raw()
+            size_offset = self.size_offset(containers[-1])
+            count_offset = self.count_offset(containers[-1])
+            size, = STRUCTS_U32[1].unpack_from(raw, size_offset)
+            grow(containers, len(data))
+            count_deltas[count_offset] = count_deltas.get(count_offset, 0) + 1
+            # deeper containers end first when they end at the same offset
+            splices.append(
+                (size_offset + 4 + size, 0, -len(containers), data))
+        for size_offset, delta in size_deltas.items():
+            size, = STRUCTS_U32[1].unpack_from(raw, size_offset)
+            splices.append(
+                (size_offset, 4, 0, STRUCTS_U32[1].pack(size + delta)))
+        for count_offset, delta in count_deltas.items():
+            count, = STRUCTS_U16[1].unpack_from(raw, count_offset)
+            splices.append(
+                (count_offset, 2, 0, STRUCTS_U16[1].pack(count + delta)))
+        # inserts before overwrites at the same offset, sort is stable
+        splices.sort(key=lambda splice: (
+            splice[0], splice[1] != 0, splice[2]))
+        pieces = []
+        pos = 0
+        for offset, old_size, depth, data in splices:
+            pieces.append(raw[pos:offset])
+            pieces.append(data)
+            pos = offset + old_size
+        pieces.append(raw[pos:])
+        return b''.join(pieces)
@@ -1,5 +1,37 @@
 from struct import Struct
 from math import sqrt
+from mmap import mmap, ACCESS_READ
+from os import fstat
+
+
+class StructCache(dict):
+    # precompiled Struct objects for one format char, keyed by count
+    # only the counts up to max_count are kept, the bigger ones (list lengths,
+    # entry counts) are built each time so the cache doesnt grow with every file read
+    __slots__ = ('fmt', 'max_count')
+
+    def __init__(self, fmt, max_count=16):
+        self.fmt = fmt
+        self.max_count = max_count
+
+    def __missing__(self, count):
+        s = Struct(f'<{count}{self.fmt}')
+        if count <= self.max_count:
+            self[count] = s
+        return s
+
+
+structs = {fmt: StructCache(fmt) for fmt in '?bBhHiIqQf'}
+STRUCTS_B = structs['?']
+STRUCTS_I8 = structs['b']
+STRUCTS_U8 = structs['B']
+STRUCTS_I16 = structs['h']
+STRUCTS_U16 = structs['H']
+STRUCTS_I32 = structs['i']
+STRUCTS_U32 = structs['I']
+STRUCTS_I64 = structs['q']
+STRUCTS_U64 = structs['Q']
+STRUCTS_F32 = structs['f']
 
 
 class Vector:
@@ -302,6 +334,9 @@ class BinStream:
     def read(self, length):
         return self.stream.read(length)
 
+    def read_view(self, length):
+        return memoryview(self.stream.read(length))
+
     def read_b(self, count=1):
         return Struct(f'<{count}?').unpack(self.stream.read(count))
 
@@ -430,4 +465,319 @@ class BinStream:
     def write_a_padded(self, value, length):
         if len(value) > length:
             value = value[:length]
-        self.stream.write(value.encode('ascii') + b'\x00'*(length-len(value)))
\ No newline at end of file
+        self.stream.write(value.encode('ascii') + b'\x00'*(length-len(value)))
+
+
+class BinReader:
+    # read only stream over a memoryview (bytes, bytearray, mmap)
+    # with an integer cursor, same read api as BinStream
+    # origin: offset of data[0] in the file it was sliced from,
+    # tell and seek work in file offsets
+    def __init__(self, data, origin=0):
+        # only the view made here is released on close, a memoryview given stays usable
+        self.owned = not isinstance(data, memoryview)
+        self.view = memoryview(data) if self.owned else data
+        self.pos = 0
+        self.origin = origin
+        self.map = None
+
+    @staticmethod
+    def map_file(path):
+        # let the os page cache serve the reads, no copy into python
+        with open(path, 'rb') as f:
+            if fstat(f.fileno()).st_size == 0:
+                return BinReader(b'')
+            m = mmap(f.fileno(), 0, access=ACCESS_READ)
+        bs = BinReader(m)
+        bs.map = m
+        return bs
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type != None:
+            # dont hide the exception that got here first
+            try:
+                self.close()
+            except Exception:
+                pass
+            return
+        self.close()
+
+    # stream
+    def tell(self):
+        return self.origin + self.pos
+
+    def seek(self, pos, mode=0):
+        if mode == 1:
+            pos += self.pos
+        elif mode == 2:
+            pos += len(self.view)
+        else:
+            pos -= self.origin
+        self.pos = pos
+
+    def pad(self, length):
+        self.pos += length
+
+    def end(self):
+        return self.origin + len(self.view)
+
+    def close(self):
+        if self.owned:
+            self.view.release()
+        if self.map != None:
+            m = self.map
+            self.map = None
+            try:
+                m.close()
+            except BufferError:
+                # slices returned by read_view are still alive and keep the file mapped,
+                # replacing or writing the file would fail later on windows
+                raise Exception(
+                    'pyRitoFile: Failed: Close mapped stream: Slices returned by read_view are still in use.')
+
+    def raw(self):
+        self.pos = len(self.view)
+        return self.view.tobytes()
+
+    # read
+    def unpack(self, fmt, count):
+        s = structs[fmt][count]
+        pos = self.pos
+        self.pos = pos + s.size
+        return s.unpack_from(self.view, pos)
+
+    def read_fmt(self, fmt, fmt_size):
+        pos = self.pos
+        self.pos = pos + fmt_size
+        return Struct(fmt).unpack_from(self.view, pos)
+
+    def read(self, length):
+        return self.read_view(length).tobytes()
+
+    def read_view(self, length):
+        # zero copy slice of the underlying buffer
+        pos = self.pos
+        self.pos = pos + length
+        return self.view[pos:self.pos]
+
+    def read_b(self, count=1):
+        s = STRUCTS_B[count]
+        pos = self.pos
+        self.pos = pos + s.size
+        return s.unpack_from(self.view, pos)
+
+    def read_i8(self, count=1):
+        s = STRUCTS_I8[count]
+        pos = self.pos
+        self.pos = pos + s.size
+        return s.unpack_from(self.view, pos)
+
+    def read_u8(self, count=1):
+        s = STRUCTS_U8[count]
+        pos = self.pos
+        self.pos = pos + s.size
+        return s.unpack_from(self.view, pos)
+
+    def read_i16(self, count=1):
+        s = STRUCTS_I16[count]
+        pos = self.pos
+        self.pos = pos + s.size
+        return s.unpack_from(self.view, pos)
+
+    def read_u16(self, count=1):
+        s = STRUCTS_U16[count]
+        pos = self.pos
+        self.pos = pos + s.size
+        return s.unpack_from(self.view, pos)
+
+    def read_i32(self, count=1):
+        s = STRUCTS_I32[count]
+        pos = self.pos
+        self.pos = pos + s.size
+        return s.unpack_from(self.view, pos)
+
+    def read_u32(self, count=1):
+        s = STRUCTS_U32[count]
+        pos = self.pos
+        self.pos = pos + s.size
+        return s.unpack_from(self.view, pos)
+
+    def read_i64(self, count=1):
+        s = STRUCTS_I64[count]
+        pos = self.pos
+        self.pos = pos + s.size
+        return s.unpack_from(self.view, pos)
+
+    def read_u64(self, count=1):
+        s = STRUCTS_U64[count]
+        pos = self.pos
+        self.pos = pos + s.size
+        return s.unpack_from(self.view, pos)
+
+    def read_f32(self, count=1):
+        s = STRUCTS_F32[count]
+        pos = self.pos
+        self.pos = pos + s.size
+        return s.unpack_from(self.view, pos)
+
+    def read_vec2(self, count=1):
+        floats = self.unpack('f', count*2)
+        return [Vector(floats[i], floats[i+1]) for i in range(0, len(floats), 2)]
+
+    def read_vec3(self, count=1):
+        floats = self.unpack('f', count*3)
+        return [Vector(floats[i], floats[i+1], floats[i+2]) for i in range(0, len(floats), 3)]
+
+    def read_vec4(self, count=1):
+        floats = self.unpack('f', count*4)
+        return [Vector(floats[i], floats[i+1], floats[i+2], floats[i+3]) for i in range(0, len(floats), 4)]
+
+    def read_quat(self, count=1):
+        floats = self.unpack('f', count*4)
+        return [Quaternion(floats[i], floats[i+1], floats[i+2], floats[i+3]) for i in range(0, len(floats), 4)]
+
+    def read_mtx4(self):
+        return Matrix4(*self.unpack('f', 16)),
+
+    def read_a(self, length):
+        return str(self.read_view(length), 'ascii'),
+
+    def read_a_padded(self, length):
+        return bytes(b for b in self.read_view(length) if b != 0).decode('ascii'),
+
+    def read_c_until0(self):
+        pos = end = self.pos
+        while self.view[end] != 0:
+            end += 1
+        self.pos = end + 1
+        return str(self.view[pos:end], 'ascii'),
+
+
+class BinWriter:
+    # growable bytearray output with a cursor, same write api as BinStream
+    # if path is given, the buffer is written to it in one go on close
+    def __init__(self, data=b'', path=None):
+        self.buffer = bytearray(data)
+        self.pos = 0
+        self.path = path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type != None:
+            # dont leave a half written file behind
+            self.path = None
+        self.close()
+
+    # stream
+    def tell(self):
+        return self.pos
+
+    def seek(self, pos, mode=0):
+        if mode == 1:
+            pos += self.pos
+        elif mode == 2:
+            pos += len(self.buffer)
+        self.pos = pos
+
+    def pad(self, length):
+        self.pos += length
+
+    def end(self):
+        return len(self.buffer)
+
+    def close(self):
+        if self.path != None:
+            with open(self.path, 'wb') as f:
+                f.write(self.buffer)
+            self.path = None
+
+    def raw(self):
+        self.pos = len(self.buffer)
+        return bytes(self.buffer)
+
+    # size slots
+    def reserve_u32(self):
+        # write a placeholder u32 and return its slot for fill_u32
+        slot = self.pos
+        self.write(b'\x00\x00\x00\x00')
+        return slot
+
+    def fill_u32(self, slot, value):
+        STRUCTS_U32[1].pack_into(self.buffer, slot, value)
+
+    # write
+    def write(self, data):
+        buffer = self.buffer
+        pos = self.pos
+        if pos == len(buffer):
+            buffer += data
+        else:
+            if pos > len(buffer):
+                buffer += bytes(pos - len(buffer))
+            buffer[pos:pos+len(data)] = data
+        self.pos = pos + len(data)
+
+    def write_fmt(self, fmt, *values):
+        self.write(Struct(fmt).pack(*values))
+
+    def write_b(self, *values):
+        self.write(STRUCTS_B[len(values)].pack(*values))
+
+    def write_i8(self, *values):
+        self.write(STRUCTS_I8[len(values)].pack(*values))
+
+    def write_u8(self, *values):
+        self.write(STRUCTS_U8[len(values)].pack(*values))
+
+    def write_i16(self, *values):
+        self.write(STRUCTS_I16[len(values)].pack(*values))
+
+    def write_u16(self, *values):
+        self.write(STRUCTS_U16[len(values)].pack(*values))
+
+    def write_i32(self, *values):
+        self.write(STRUCTS_I32[len(values)].pack(*values))
+
+    def write_u32(self, *values):
+        self.write(STRUCTS_U32[len(values)].pack(*values))
+
+    def write_i64(self, *values):
+        self.write(STRUCTS_I64[len(values)].pack(*values))
+
+    def write_u64(self, *values):
+        self.write(STRUCTS_U64[len(values)].pack(*values))
+
+    def write_f32(self, *values):
+        self.write(STRUCTS_F32[len(values)].pack(*values))
+
+    def write_vec2(self, *values):
+        floats = [f for vec in values for f in vec]
+        self.write(STRUCTS_F32[len(floats)].pack(*floats))
+
+    def write_vec3(self, *values):
+        floats = [f for vec in values for f in vec]
+        self.write(STRUCTS_F32[len(floats)].pack(*floats))
+
+    def write_vec4(self, *values):
+        floats = [f for vec in values for f in vec]
+        self.write(STRUCTS_F32[len(floats)].pack(*floats))
+
+    def write_quat(self, *values):
+        floats = [f for quat in values for f in quat]
+        self.write(STRUCTS_F32[len(floats)].pack(*floats))
+
+    def write_mtx4(self, mtx4):
+        self.write(STRUCTS_F32[16].pack(*mtx4))
+
+    def write_a(self, value):
+        self.write(value.encode('ascii'))
+
+    def write_a_padded(self, value, length):
+        if len(value) > length:
+            value = value[:length]
+        self.write(value.encode('ascii') + b'\x00'*(length-len(value)))
@@ -1,7 +1,12 @@
-from io import BytesIO
-from LtMAO.binstream import BinStream
+from os import remove, replace
+from struct import Struct
+from threading import local
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from LtMAO.binstream import BinStream, BinReader, BinWriter
 from enum import Enum
 import gzip
+import zlib
 import pyzstd
 from xxhash import xxh64, xxh3_64
 
@@ -36,13 +41,30 @@ signature_to_extension = {
 }
 
 
+# signature_to_extension grouped by the first 2 bytes, in the same order
+signature_prefixes = {}
+for signature, extension in signature_to_extension.items():
+    signature_prefixes.setdefault(signature[:2], []).append(
+        (signature, extension))
+# bytes needed to match the longest signature
+sniff_length = 32
+
+# table of contents record, v1 has no checksum
+toc_struct = Struct('<QIIIB?HQ')
+toc_struct_v1 = Struct('<QIIIB?H')
+# subchunk toc record: compressed size, decompressed size, checksum
+subchunk_struct = Struct('<IIQ')
+# the subchunk count is the high nibble of the compression byte, the start is a u16
+max_subchunk_count = 15
+max_subchunk_start = 0xFFFF
+
+
 def guess_extension(data):
-    if data[4:8] == bytes.fromhex('c34ffd22'):
+    if data[4:8] == b'\xc3\x4f\xfd\x22':
         return 'skl'
-    else:
-        for signature, extension in signature_to_extension.items():
-            if data.startswith(signature):
-                return extension
+    for signature, extension in signature_prefixes.get(bytes(data[:2]), ()):
+        if data.startswith(signature):
+            return extension
 
 
 def parse_extension(path):
@@ -91,12 +113,183 @@ class WADCompressionType(Enum):
         return self.name
 
 
+class WADCompressionRule:
+    __slots__ = ('mode', 'level', 'raw_if_larger', 'keep')
+
+    def __init__(self, mode='zstd', level=0, raw_if_larger=False, keep=True):
+        # mode: 'zstd' or 'raw'
+        # level: zstd level, 0 is the zstd default level
+        # raw_if_larger: store raw if the zstd data is not smaller
+        # keep: copy the chunks from another wad as they are, else decompress and use mode
+        self.mode = mode
+        self.level = level
+        self.raw_if_larger = raw_if_larger
+        self.keep = keep
+
+    def __json__(self):
+        return {key: getattr(self, key) for key in self.__slots__}
+
+
+class WADCompressionPolicy:
+    __slots__ = ('rules', 'default')
+
+    def __init__(self, rules=None, default=None):
+        # rules: [(extensions or None, max decompressed size or None, WADCompressionRule)]
+        # the first rule that matches a chunk is used, default if none
+        self.rules = rules if rules != None else []
+        self.default = default if default != None else WADCompressionRule()
+
+    def __json__(self):
+        return {key: getattr(self, key) for key in self.__slots__}
+
+    def rule(self, extension, size):
+        for extensions, max_size, rule in self.rules:
+            if (extensions == None or extension in extensions) and (max_size == None or size <= max_size):
+                return rule
+        return self.default
+
+
+default_compression = WADCompressionPolicy(
+    [(('bnk', 'wpk'), None, WADCompressionRule('raw'))])
+
+# zstd compressors of each thread, by level
+zstd_compressors = local()
+
+
+def zstd_compress(data, level=0):
+    compressors = zstd_compressors.__dict__
+    compressor = compressors.get(level)
+    if compressor == None:
+        compressor = compressors[level] = pyzstd.ZstdCompressor(level)
+    return compressor.compress(data, pyzstd.ZstdCompressor.FLUSH_FRAME)
+
+
+def decompress_subchunk(raw, decompressed_size):
+    # subchunks that dont get smaller are stored raw
+    if len(raw) == decompressed_size:
+        return bytes(raw)
+    return pyzstd.decompress(raw)
+
+
+def decompress_subchunks(raw, subchunks, executor=None):
+    # decompress each subchunk of a ZstdChunked data, on executor (a thread pool) if given
+    raws, decompressed_sizes = [], []
+    offset = 0
+    for compressed_size, decompressed_size, checksum in subchunks:
+        raws.append(raw[offset:offset+compressed_size])
+        decompressed_sizes.append(decompressed_size)
+        offset += compressed_size
+    if executor == None or len(raws) < 2:
+        return list(map(decompress_subchunk, raws, decompressed_sizes))
+    return list(executor.map(decompress_subchunk, raws, decompressed_sizes))
+
+
+def compress_subchunks(chunk_data, subchunk_size, level=0):
+    # split a chunk data in subchunks compressed alone: (data, subchunk toc records)
+    # subchunk_size is raised for the datas that would need more than max_subchunk_count
+    subchunk_size = max(subchunk_size, -(-len(chunk_data) // max_subchunk_count))
+    datas, subchunks = [], []
+    for offset in range(0, len(chunk_data), subchunk_size):
+        piece = chunk_data[offset:offset+subchunk_size]
+        data = zstd_compress(piece, level)
+        if len(data) >= len(piece):
+            data = bytes(piece)
+        datas.append(data)
+        subchunks.append(
+            (len(data), len(piece), xxh3_64(data).intdigest()))
+    return b''.join(datas), subchunks
+
+
+def decompress_data(compression_type, raw, subchunks=None, executor=None):
+    # subchunks: subchunk toc records of a ZstdChunked data (see WAD.read_subchunk_toc)
+    if compression_type == WADCompressionType.Raw:
+        return bytes(raw)
+    elif compression_type == WADCompressionType.Gzip:
+        return gzip.decompress(raw)
+    elif compression_type == WADCompressionType.Satellite:
+        # Satellite is not supported
+        return None
+    elif compression_type == WADCompressionType.Zstd:
+        return pyzstd.decompress(raw)
+    elif compression_type == WADCompressionType.ZstdChunked:
+        if subchunks:
+            return b''.join(decompress_subchunks(raw, subchunks, executor))
+        if raw[:4] == b'\x28\xb5\x2f\xfd':
+            return pyzstd.decompress(raw)
+        else:
+            return bytes(raw)
+
+
+def sniff_data(compression_type, raw, length=sniff_length):
+    # decompress only the first length bytes of a chunk data
+    if compression_type == WADCompressionType.Raw:
+        return bytes(raw[:length])
+    elif compression_type == WADCompressionType.Gzip:
+        return zlib.decompressobj(31).decompress(raw, length)
+    elif compression_type == WADCompressionType.Satellite:
+        # Satellite is not supported
+        return None
+    elif compression_type == WADCompressionType.Zstd:
+        return pyzstd.ZstdDecompressor().decompress(raw, length)
+    elif compression_type == WADCompressionType.ZstdChunked:
+        if raw[:4] == b'\x28\xb5\x2f\xfd':
+            return pyzstd.ZstdDecompressor().decompress(raw, length)
+        else:
+            return bytes(raw[:length])
+
+
+def transform_data(compression_type, raw, extension, transform, subchunks=None):
+    # decompress a chunk data and run transform(extension, data) on it
+    # returns (extension, transform result, transform exception)
+    # module function so it can run on a process pool
+    data = decompress_data(compression_type, raw, subchunks)
+    if extension == None:
+        extension = guess_extension(data)
+    try:
+        return extension, transform(extension, data), None
+    except Exception as e:
+        # the traceback frames would keep raw alive, and with it the mapped file
+        exception = e
+        while exception != None:
+            exception.__traceback__ = None
+            exception = exception.__context__
+        return extension, None, e
+
+
+def compress_data(extension, chunk_data, subchunk_size=0, policy=None):
+    # compress a chunk data: (data, compression type, decompressed size, checksum, subchunks)
+    # subchunk_size: datas bigger than it are compressed as ZstdChunked
+    # policy: WADCompressionPolicy, default_compression if None
+    # module function so it can run on a process pool
+    rule = (policy or default_compression).rule(extension, len(chunk_data))
+    subchunks = None
+    if rule.mode == 'raw':
+        data = chunk_data
+        compression_type = WADCompressionType.Raw
+    elif subchunk_size and len(chunk_data) > subchunk_size:
+        data, subchunks = compress_subchunks(
+            chunk_data, subchunk_size, rule.level)
+        compression_type = WADCompressionType.ZstdChunked
+    else:
+        data = zstd_compress(chunk_data, rule.level)
+        compression_type = WADCompressionType.Zstd
+        if rule.raw_if_larger and len(data) >= len(chunk_data):
+            data = chunk_data
+            compression_type = WADCompressionType.Raw
+    return data, compression_type, len(chunk_data), xxh3_64(data).intdigest(), subchunks
+
+
+def recompress_data(compression_type, raw, subchunks, extension, subchunk_size=0, policy=None):
+    # compress_data for a chunk data from another wad
+    return compress_data(extension, decompress_data(compression_type, raw, subchunks), subchunk_size, policy)
+
+
 class WADChunk:
     __slots__ = (
         'id', 'hash', 'offset',
         'compressed_size', 'decompressed_size', 'compression_type',
         'duplicated', 'subchunk_start', 'subchunk_count',
-        'checksum', 'data', 'extension'
+        'checksum', 'data', 'extension', 'raw', 'subchunks'
     )
 
     def __init__(self):
@@ -112,9 +305,11 @@ class WADChunk:
         self.checksum = None
         self.data = None
         self.extension = None
+        self.raw = None
+        self.subchunks = None
 
     def __json__(self):
-        return {key: getattr(self, key) for key in self.__slots__ if key != 'data'}
+        return {key: getattr(self, key) for key in self.__slots__ if key not in ('data', 'raw', 'subchunks')}
 
     @staticmethod
     def default(*, id=0, hash='', offset=0, compressed_size=0, decompressed_size=0, compression_type=WADCompressionType.Raw, duplicated=False, subchunk_start=0, subchunk_count=0, checksum=0):
@@ -129,63 +324,136 @@ class WADChunk:
         chunk.subchunk_start = subchunk_start
         chunk.subchunk_count = subchunk_count
         chunk.checksum = checksum
+        chunk.subchunks = None
         return chunk
 
     def free_data(self):
         self.data = None
+        self.raw = None
+
+    def read_raw(self, bs):
+        # read compressed data as it is stored, for write_raw
+        bs.seek(self.offset)
+        self.raw = bs.read_view(self.compressed_size)
+        return self.raw
 
-    def read_data(self, bs):
+    @staticmethod
+    def from_record(id, record):
+        # record: toc_struct values
+        chunk = WADChunk()
+        chunk.id = id
+        hash, chunk.offset, chunk.compressed_size, chunk.decompressed_size, compression, chunk.duplicated, chunk.subchunk_start = record[:7]
+        chunk.hash = hash_to_hex(hash)
+        chunk.compression_type = WADCompressionType(compression & 15)
+        chunk.subchunk_count = compression >> 4
+        chunk.checksum = record[7] if len(record) > 7 else 0
+        chunk.subchunks = None
+        return chunk
+
+    def read_extension(self, bs):
+        # guess extension from the start of the data only
+        if self.extension == None:
+            bs.seek(self.offset)
+            data = sniff_data(self.compression_type,
+                              bs.read_view(self.compressed_size))
+            if data != None:
+                self.extension = guess_extension(data)
+        return self.extension
+
+    def read_data(self, bs, executor=None):
         # read data and decompress
+        # executor: thread pool to decompress the subchunks on
         bs.seek(self.offset)
-        raw = bs.read(self.compressed_size)
-        if self.compression_type == WADCompressionType.Raw:
-            self.data = raw
-        elif self.compression_type == WADCompressionType.Gzip:
-            self.data = gzip.decompress(raw)
-        elif self.compression_type == WADCompressionType.Satellite:
-            # Satellite is not supported
-            self.data = None
-        elif self.compression_type == WADCompressionType.Zstd:
-            self.data = pyzstd.decompress(raw)
-        elif self.compression_type == WADCompressionType.ZstdChunked:
-            if raw[:4] == b'\x28\xb5\x2f\xfd':
-                self.data = pyzstd.decompress(raw)
-            else:
-                self.data = raw
+        self.data = decompress_data(
+            self.compression_type, bs.read_view(self.compressed_size), self.subchunks, executor)
         # guess extension
         if self.extension == None:
             self.extension = guess_extension(self.data)
 
-    def write_data(self, bs, chunk_id, chunk_hash, chunk_data, *, previous_chunks=None):
+    def read_subchunk(self, bs, index):
+        # read and decompress one subchunk, need subchunks (see WAD.read_subchunk_toc)
+        compressed_size, decompressed_size, checksum = self.subchunks[index]
+        bs.seek(self.offset +
+                sum(subchunk[0] for subchunk in self.subchunks[:index]))
+        return decompress_subchunk(bs.read_view(compressed_size), decompressed_size)
+
+    def write_data(self, bs, chunk_id, chunk_hash, chunk_data, *, previous_chunks=None, duplicates=None, compressed=None, subchunk_toc=None):
+        # compressed: compress_data result if it was done before (see WAD.write_chunks)
+        # subchunk_toc: list of the subchunk toc records written, ZstdChunked chunks add theirs to it
+        self.id = chunk_id
         self.hash = chunk_hash
-        if self.extension in ('bnk', 'wpk'):
-            self.data = chunk_data
-            self.compression_type = WADCompressionType.Raw
-        else:
-            self.data = pyzstd.compress(chunk_data)
-            self.compression_type = WADCompressionType.Zstd
+        if compressed == None:
+            compressed = compress_data(self.extension, chunk_data)
+        self.data, self.compression_type, self.decompressed_size, self.checksum, self.subchunks = compressed
         self.compressed_size = len(self.data)
-        self.decompressed_size = len(chunk_data)
+        self.subchunk_start = 0
+        self.subchunk_count = 0
+        if self.subchunks != None:
+            self.add_subchunks(chunk_hash, subchunk_toc)
+        self.place_data(bs, previous_chunks, duplicates)
+
+    def write_raw(self, bs, chunk_id, chunk_hash, source, *, previous_chunks=None, duplicates=None, subchunk_toc=None):
+        # copy the compressed data of a chunk from another wad (source.read_raw)
+        # without decompress/recompress it
+        self.id = chunk_id
+        self.hash = chunk_hash
+        self.data = source.raw
+        self.compression_type = source.compression_type
+        self.compressed_size = source.compressed_size
+        self.decompressed_size = source.decompressed_size
+        self.subchunk_start = source.subchunk_start
+        self.subchunk_count = source.subchunk_count
+        self.subchunks = source.subchunks
+        if subchunk_toc != None and self.compression_type == WADCompressionType.ZstdChunked:
+            if self.subchunks == None:
+                raise Exception(
+                    f'pyRitoFile: Failed: Write WAD chunk {chunk_hash}: Missing subchunks of source chunk.')
+            self.add_subchunks(chunk_hash, subchunk_toc)
+        # older wad versions dont use xxh3 checksum
         self.checksum = xxh3_64(self.data).intdigest()
+        self.place_data(bs, previous_chunks, duplicates)
+
+    def add_subchunks(self, chunk_hash, subchunk_toc):
+        if subchunk_toc == None:
+            raise Exception(
+                f'pyRitoFile: Failed: Write WAD chunk {chunk_hash}: ZstdChunked chunk without a subchunk toc.')
+        if len(self.subchunks) > max_subchunk_count or len(subchunk_toc) > max_subchunk_start:
+            raise Exception(
+                f'pyRitoFile: Failed: Write WAD chunk {chunk_hash}: Subchunks dont fit in the toc record: {len(self.subchunks)} subchunks starting at {len(subchunk_toc)}.')
+        self.subchunk_start = len(subchunk_toc)
+        self.subchunk_count = len(self.subchunks)
+        subchunk_toc.extend(self.subchunks)
+
+    def place_data(self, bs, previous_chunks=None, duplicates=None):
+        # duplicates: {(checksum, compressed_size, decompressed_size): chunk}
+        # index of the chunks written before, updated with this chunk
         # check duplicated data
-        if previous_chunks:
-            duped_id, duped_chunk = None, None
+        self.duplicated = False
+        duped_id, duped_chunk = None, None
+        if duplicates != None:
+            key = (self.checksum, self.compressed_size, self.decompressed_size)
+            duped_chunk = duplicates.get(key)
+            if duped_chunk != None:
+                duped_id = duped_chunk.id
+            else:
+                duplicates[key] = self
+        elif previous_chunks:
             for id, chunk in enumerate(previous_chunks):
                 if chunk.checksum == self.checksum and chunk.compressed_size == self.compressed_size and chunk.decompressed_size == self.decompressed_size:
                     duped_id = id
                     duped_chunk = chunk
                     break
-            if duped_chunk != None:
-                # if there is a duped chunk in previous
-                if not duped_chunk.duplicated:
-                    # if the chunk was not a duped chunk
-                    # rewrite the duplicated value for the previous chunk
-                    duped_chunk.duplicated = True
-                    bs.seek(272 + duped_id * 32 + 21)
-                    bs.write_b(duped_chunk.duplicated)
-                # set this chunk as duplicated and copy the offset from duped chunk
-                self.duplicated = True
-                self.offset = duped_chunk.offset
+        if duped_chunk != None:
+            # if there is a duped chunk in previous
+            if not duped_chunk.duplicated:
+                # if the chunk was not a duped chunk
+                # rewrite the duplicated value for the previous chunk
+                duped_chunk.duplicated = True
+                bs.seek(272 + duped_id * 32 + 21)
+                bs.write_b(duped_chunk.duplicated)
+            # set this chunk as duplicated and copy the offset from duped chunk
+            self.duplicated = True
+            self.offset = duped_chunk.offset
         if not self.duplicated:
             # if its duplicated dont need to write data
             # go to end file, save data offset and write chunk data
@@ -194,19 +462,53 @@ class WADChunk:
             bs.write(self.data)
         # go to this chunk offset and write stuffs
         # hack: the first chunk start at 272 (because we write version 3.3)
-        self.id = chunk_id
-        chunk_offset = 272 + chunk_id * 32
+        chunk_offset = 272 + self.id * 32
         bs.seek(chunk_offset)
-        bs.write_u64(name_or_hex_to_hash(chunk_hash))
-        bs.write_u32(
+        bs.write(toc_struct.pack(
+            name_or_hex_to_hash(self.hash),
             self.offset,
             self.compressed_size,
-            self.decompressed_size
-        )
-        bs.write_u8(self.compression_type.value)
-        bs.write_b(self.duplicated)
-        bs.write_u16(0)
-        bs.write_u64(self.checksum)
+            self.decompressed_size,
+            self.compression_type.value | self.subchunk_count << 4,
+            self.duplicated,
+            self.subchunk_start,
+            self.checksum
+        ))
+
+
+class WADChunks:
+    # the chunks of a read wad, kept as toc records
+    # WADChunk objects are only made when accessed
+    __slots__ = ('records', 'chunks')
+
+    def __init__(self, records):
+        self.records = records
+        self.chunks = [None] * len(records)
+
+    def __json__(self):
+        return list(self)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, id):
+        if isinstance(id, slice):
+            return [self[i] for i in range(*id.indices(len(self)))]
+        chunk = self.chunks[id]
+        if chunk == None:
+            if id < 0:
+                id += len(self.records)
+            chunk = WADChunk.from_record(id, self.records[id])
+            self.chunks[id] = chunk
+        return chunk
+
+    def __iter__(self):
+        for id in range(len(self.records)):
+            yield self[id]
+
+    def find(self, hashes):
+        # ids of the chunks with these int hashes
+        return [id for id, record in enumerate(self.records) if record[0] in hashes]
 
 
 class WAD:
@@ -220,16 +522,20 @@ class WAD:
     def __json__(self):
         return {key: getattr(self, key) for key in self.__slots__ if key != 'IO'}
 
-    def stream(self, path, mode, raw=None):
+    def stream(self, path, mode, raw=None, mapped=False):
         if raw != None:
             if raw == True:  # the bool True value
-                return BinStream(BytesIO())
+                return BinWriter()
+            elif 'w' in mode or '+' in mode:
+                return BinWriter(raw)
             else:
-                return BinStream(BytesIO(raw))
+                return BinReader(raw)
+        if mapped and mode == 'rb':
+            return BinReader.map_file(path)
         return BinStream(open(path, mode))
 
-    def read(self, path, raw=None):
-        with self.stream(path, 'rb', raw) as bs:
+    def read(self, path, raw=None, mapped=False):
+        with self.stream(path, 'rb', raw, mapped) as bs:
             # read header
             self.signature, = bs.read_a(2)
             if self.signature != 'RW':
@@ -253,19 +559,9 @@ class WAD:
                     2)
             # read chunks
             chunk_count, = bs.read_u32()
-            self.chunks = [WADChunk() for i in range(chunk_count)]
-            for i in range(chunk_count):
-                chunk = self.chunks[i]
-                chunk.id = i
-                chunk.hash = hash_to_hex(bs.read_u64()[0])
-                chunk.offset, chunk.compressed_size, chunk.decompressed_size, = bs.read_u32(
-                    3)
-                chunk.compression_type = WADCompressionType(
-                    bs.read_u8()[0] & 15)
-                chunk.duplicated, = bs.read_b()
-                chunk.subchunk_start, = bs.read_u16()
-                chunk.subchunk_count = chunk.compression_type.value >> 4
-                chunk.checksum = bs.read_u64()[0] if major >= 2 else 0
+            record_struct = toc_struct if major >= 2 else toc_struct_v1
+            self.chunks = WADChunks(list(record_struct.iter_unpack(
+                bs.read(chunk_count * record_struct.size))))
 
     def write(self, path, raw=None):
         with self.stream(path, 'wb', raw) as bs:
@@ -277,18 +573,241 @@ class WAD:
             bs.write_u32(len(self.chunks))
             # write chunks
             for chunk in self.chunks:
-                bs.write_u64(name_or_hex_to_hash(chunk.hash))
-                bs.write_u32(
+                bs.write(toc_struct.pack(
+                    name_or_hex_to_hash(chunk.hash),
                     chunk.offset,
                     chunk.compressed_size,
-                    chunk.decompressed_size
-                )
-                bs.write_u8(chunk.compression_type.value)
-                bs.write_b(chunk.duplicated)
-                bs.write_u16(chunk.subchunk_start)
-                bs.write_u64(chunk.checksum)
+                    chunk.decompressed_size,
+                    chunk.compression_type.value | chunk.subchunk_count << 4,
+                    chunk.duplicated,
+                    chunk.subchunk_start,
+                    chunk.checksum
+                ))
+            return bs.raw() if raw else None
+
+    def patch(self, path, chunk_datas, raw=None, policy=None):
+        # update chunks without rewrite the wad: append their new datas at the end
+        # and rewrite their toc records, the old datas are left as dead space (see compact)
+        # chunk_datas: {chunk id: chunk data}, self need to be the read wad of path
+        # checksums are xxh3 since 3.1, older wads need a full write
+        if int(self.version) != 3 or self.version < 3.1:
+            raise Exception(
+                f'pyRitoFile: Failed: Patch WAD {path}: Unsupported file version: {self.version}')
+        # patched chunks with the same data share one appended copy
+        duplicates = {}
+        with self.stream(path, 'rb+', raw) as bs:
+            for chunk_id in sorted(chunk_datas):
+                chunk = self.chunks[chunk_id]
+                chunk.write_data(bs, chunk_id, chunk.hash, None, duplicates=duplicates, compressed=compress_data(
+                    chunk.extension, chunk_datas[chunk_id], policy=policy))
+                chunk.free_data()
             return bs.raw() if raw else None
 
+    def compact(self, path):
+        # rewrite the wad without the dead space left by patch, self need to be the read wad of path
+        # write_file removes temp_path if it fails
+        temp_path = path + '.tmp'
+        with self.stream(path, 'rb', mapped=True) as bs:
+            for chunk in self.chunks:
+                chunk.read_raw(bs)
+            wad = WAD()
+            wad.write_file(temp_path, [chunk.hash for chunk in self.chunks], list(self.chunks))
+            for chunk in self.chunks:
+                chunk.free_data()
+        replace(temp_path, path)
+        self.version = 3.3
+        self.chunks = wad.chunks
+
+    def write_file(self, path, chunk_hashes, chunk_datas, **kwargs):
+        # write the wad to a file with chunk datas coming one by one (see write_chunks),
+        # the header and toc are written first then each chunk data is appended
+        # and its toc record filled, so only the chunks in flight are in memory
+        self.chunks = [WADChunk.default() for _ in range(len(chunk_hashes))]
+        self.write(path)
+        try:
+            with self.stream(path, 'rb+') as bs:
+                self.write_chunks(bs, chunk_hashes, chunk_datas, **kwargs)
+        except:
+            # dont leave a half written file behind
+            remove(path)
+            raise
+
+    def write_chunks(self, bs, chunk_hashes, chunk_datas, *, workers=1, processes=False, subchunk_size=0, subchunk_toc_id=None, policy=None):
+        # write chunk datas into a stream that starts with self.write output
+        # duplicated datas are found with an index kept across the chunks
+        # a chunk data can be a WADChunk with read_raw done, it is copied as it is
+        # if the policy rule keeps it, else it is decompressed and compressed again
+        # policy: WADCompressionPolicy, default_compression if None
+        # workers > 1: compress on a thread pool (or a process pool),
+        # the chunks are still placed in order so the output is the same
+        # subchunk_toc_id: the subchunk toc chunk, its data is made from the ZstdChunked chunks written
+        # and the ones copied are given new subchunk_start (their subchunks need to be read)
+        # subchunk_size: compress datas bigger than it as ZstdChunked, need subchunk_toc_id
+        if subchunk_size and subchunk_toc_id == None:
+            raise Exception(
+                'pyRitoFile: Failed: Write WAD: ZstdChunked compression without a subchunk toc chunk.')
+        policy = policy or default_compression
+        kept = [
+            isinstance(chunk_data, WADChunk) and policy.rule(
+                chunk_data.extension, chunk_data.decompressed_size).keep
+            for chunk_data in chunk_datas
+        ]
+        subchunk_toc = [] if subchunk_toc_id != None else None
+        duplicates = {}
+        executor = None
+        if workers > 1:
+            executor = ProcessPoolExecutor(workers) if processes else ThreadPoolExecutor(workers)
+        try:
+            jobs = (
+                self.compress_job(chunk, chunk_data, subchunk_size,
+                                  policy, processes)
+                for chunk_id, (chunk, chunk_data) in enumerate(zip(self.chunks, chunk_datas))
+                if not kept[chunk_id] and chunk_id != subchunk_toc_id
+            )
+            compressed_datas = self.compress_datas(
+                jobs, executor, workers * 2)
+            for chunk_id, chunk in enumerate(self.chunks):
+                if chunk_id == subchunk_toc_id:
+                    continue
+                if kept[chunk_id]:
+                    chunk.write_raw(bs, chunk_id, chunk_hashes[chunk_id],
+                                    chunk_datas[chunk_id], duplicates=duplicates, subchunk_toc=subchunk_toc)
+                else:
+                    chunk.write_data(bs, chunk_id, chunk_hashes[chunk_id],
+                                     None, duplicates=duplicates, compressed=next(compressed_datas), subchunk_toc=subchunk_toc)
+                chunk.free_data()
+        finally:
+            if executor != None:
+                executor.shutdown(cancel_futures=True)
+        if subchunk_toc_id != None:
+            data = b''.join(subchunk_struct.pack(*subchunk)
+                            for subchunk in subchunk_toc)
+            chunk = self.chunks[subchunk_toc_id]
+            chunk.write_data(bs, subchunk_toc_id, chunk_hashes[subchunk_toc_id], data, duplicates=duplicates, compressed=(
+                data, WADCompressionType.Raw, len(data), xxh3_64(data).intdigest(), None))
+            chunk.free_data()
+
+    @staticmethod
+    def compress_job(chunk, chunk_data, subchunk_size, policy, processes=False):
+        # (function, args) that compress a chunk data for write_chunks
+        if isinstance(chunk_data, WADChunk):
+            raw = chunk_data.raw.tobytes() if processes else chunk_data.raw
+            return recompress_data, (chunk_data.compression_type, raw, chunk_data.subchunks, chunk_data.extension, subchunk_size, policy)
+        extension = chunk.extension
+        if extension == None:
+            extension = guess_extension(bytes(chunk_data[:sniff_length]))
+        return compress_data, (extension, chunk_data, subchunk_size, policy)
+
+    @staticmethod
+    def compress_datas(jobs, executor=None, window=1):
+        # yield the results of jobs (function, args) in order
+        # with executor, at most window jobs are done ahead
+        if executor == None:
+            for function, args in jobs:
+                yield function(*args)
+            return
+        pending = deque()
+        for function, args in jobs:
+            pending.append(executor.submit(function, *args))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+    def find_subchunk_toc(self, paths=None):
+        # the subchunk toc chunk, by its path (like data/final/champions/annie.wad.subchunktoc)
+        # paths: the paths it can have, if none is found (or no paths)
+        # look for a chunk with the size of the toc that the ZstdChunked chunks use
+        if paths:
+            chunks = self.find_chunks(paths)
+            if chunks:
+                return chunks[0]
+        subchunk_count = max((chunk.subchunk_start + chunk.subchunk_count for chunk in self.chunks
+                              if chunk.compression_type == WADCompressionType.ZstdChunked), default=0)
+        if subchunk_count == 0:
+            return None
+        for chunk in self.chunks:
+            if chunk.compression_type != WADCompressionType.ZstdChunked and chunk.decompressed_size == subchunk_count * subchunk_struct.size:
+                return chunk
+        return None
+
+    def read_subchunk_toc(self, bs, paths=None):
+        # set the subchunks of the ZstdChunked chunks from the subchunk toc chunk (see find_subchunk_toc)
+        # returns the subchunk toc chunk
+        toc_chunk = self.find_subchunk_toc(paths)
+        if toc_chunk == None:
+            return None
+        toc_chunk.read_data(bs)
+        subchunk_toc = list(subchunk_struct.iter_unpack(toc_chunk.data))
+        toc_chunk.free_data()
+        for chunk in self.chunks:
+            if chunk.compression_type == WADCompressionType.ZstdChunked:
+                subchunks = subchunk_toc[chunk.subchunk_start:chunk.subchunk_start+chunk.subchunk_count]
+                # skip the chunks that dont match this toc
+                if len(subchunks) == chunk.subchunk_count and sum(subchunk[0] for subchunk in subchunks) == chunk.compressed_size:
+                    chunk.subchunks = subchunks
+        return toc_chunk
+
+    def find_chunks(self, paths):
+        # chunks of these file paths, matched by path hash
+        if isinstance(self.chunks, WADChunks):
+            hashes = {name_to_hash(path) for path in paths}
+            return [self.chunks[id] for id in self.chunks.find(hashes)]
+        hashes = {hash_to_hex(name_to_hash(path)) for path in paths}
+        return [chunk for chunk in self.chunks if chunk.hash in hashes]
+
+    def transform_chunks(self, bs, transform, *, workers=1, processes=False, window=None, extensions=None, chunks=None):
+        # yield (chunk, transform result, transform exception) in chunk order
+        # chunks: only transform these chunks (see find_chunks)
+        # extensions: only transform the chunks with these extensions, found with read_extension,
+        # the others are yielded as (chunk, None, None) without decompress them
+        # the chunks are decompressed and transformed on a thread pool (or a process pool,
+        # transform need to be a module function then) with at most window chunks in flight
+        if window == None:
+            window = workers * 2
+        executor = None
+        if workers > 1:
+            executor = ProcessPoolExecutor(workers) if processes else ThreadPoolExecutor(workers)
+        selected = None if chunks == None else {chunk.id for chunk in chunks}
+        try:
+            pending = deque()
+            for chunk in self.chunks:
+                if selected != None and chunk.id not in selected:
+                    skipped = True
+                else:
+                    skipped = extensions != None and chunk.read_extension(bs) not in extensions
+                if skipped:
+                    if executor == None:
+                        yield chunk, None, None
+                    else:
+                        pending.append((chunk, None))
+                    continue
+                bs.seek(chunk.offset)
+                raw = bs.read_view(chunk.compressed_size)
+                if executor == None:
+                    chunk.extension, data, exception = transform_data(
+                        chunk.compression_type, raw, chunk.extension, transform, chunk.subchunks)
+                    yield chunk, data, exception
+                    continue
+                if processes:
+                    raw = raw.tobytes()
+                pending.append((chunk, executor.submit(
+                    transform_data, chunk.compression_type, raw, chunk.extension, transform, chunk.subchunks)))
+                while len(pending) >= window:
+                    yield self.transform_result(*pending.popleft())
+            while pending:
+                yield self.transform_result(*pending.popleft())
+        finally:
+            if executor != None:
+                executor.shutdown(cancel_futures=True)
+
+    @staticmethod
+    def transform_result(chunk, future):
+        if future == None:
+            return chunk, None, None
+        chunk.extension, data, exception = future.result()
+        return chunk, data, exception
+
     def un_hash(self, hashtables=None):
         if hashtables == None:
             return
@@ -0,0 +1,53 @@
+"""
+Per field cost of BIN.read with the old BytesIO backed BinStream
+against the memoryview backed BinReader, plus the bare cost of one read_u32.
+python -m benchmarks.bench_binstream [entry_count]
+"""
+from io import BytesIO
+from sys import argv
+from time import perf_counter
+from LtMAO.binfile import BIN
+from LtMAO.binstream import BinStream, BinReader
+from benchmarks.synthetic import make_bin, count_fields
+
+
+class BytesIOBIN(BIN):
+    __slots__ = ()
+
+    def stream(self, path, mode, raw=None, mapped=False):
+        return BinStream(BytesIO(raw))
+
+
+def bench(bin_class, data, repeat=5):
+    best = None
+    for i in range(repeat):
+        bin_file = bin_class()
+        start = perf_counter()
+        bin_file.read('', raw=data)
+        elapsed = perf_counter() - start
+        best = elapsed if best == None else min(best, elapsed)
+    return best, bin_file
+
+
+def bench_read_u32(bs, count):
+    start = perf_counter()
+    bs.seek(0)
+    for i in range(count):
+        bs.read_u32()
+    return perf_counter() - start
+
+
+if __name__ == '__main__':
+    entry_count = int(argv[1]) if len(argv) > 1 else 2000
+    data = make_bin(entry_count)
+    for name, bin_class in (('BinStream(BytesIO)', BytesIOBIN), ('BinReader', BIN)):
+        elapsed, bin_file = bench(bin_class, data)
+        field_count = sum(count_fields(entry.data)
+                          for entry in bin_file.entries)
+        print(f'{name:20} {len(data)/1024/1024:.1f} MB, {field_count} fields: '
+              f'{elapsed*1000:.1f} ms, {elapsed/field_count*1e9:.0f} ns/field')
+
+    count = len(data) // 4
+    for name, bs in (('BinStream(BytesIO)', BinStream(BytesIO(data))), ('BinReader', BinReader(data))):
+        elapsed = bench_read_u32(bs, count)
+        print(f'{name:20} read_u32 x {count}: {elapsed/count*1e9:.0f} ns/read')
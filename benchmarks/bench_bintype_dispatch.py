@@ -0,0 +1,364 @@
+"""
+BINHelper.read_field/write_field against the if/elif chains they replaced,
+both timed on the same fields: the entries of the bins given, or of
+benchmarks.synthetic.make_bin without paths (a synthetic type mix, use real skin bins for real numbers).
+The current BINHelper also has the bulk List/List2 path, so they are timed again
+without the List/List2 fields for the dispatch alone.
+python -m benchmarks.bench_bintype_dispatch [path/to/skin.bin ...]
+"""
+from sys import argv
+from time import perf_counter
+from LtMAO.binfile import BIN, BINHelper, BINField, BINType, hash_to_hex, name_or_hex_to_hash
+from LtMAO.binstream import BinReader, BinWriter
+from benchmarks.synthetic import make_bin, count_fields
+
+
+class IfElifBINHelper:
+    # BINHelper read/write before the per type tables, kept as the baseline
+    @staticmethod
+    def fix_type(bin_type, legacy=False):
+        if legacy:
+            if bin_type >= 129:
+                bin_type += 1
+        return BINType(bin_type)
+
+    @staticmethod
+    def read_value(bs, value_type, int_hashes=False):
+        # int_hashes: keep hashes as int instead of hex string
+        value = None
+        if value_type == BINType.Empty:
+            value = bs.read_u16(3)
+        elif value_type == BINType.Bool:
+            value = bs.read_b()[0]
+        elif value_type == BINType.I8:
+            value = bs.read_i8()[0]
+        elif value_type == BINType.U8:
+            value = bs.read_u8()[0]
+        elif value_type == BINType.I16:
+            value = bs.read_i16()[0]
+        elif value_type == BINType.U16:
+            value = bs.read_u16()[0]
+        elif value_type == BINType.I32:
+            value = bs.read_i32()[0]
+        elif value_type == BINType.U32:
+            value = bs.read_i32()[0]
+        elif value_type == BINType.I64:
+            value = bs.read_i64()[0]
+        elif value_type == BINType.U64:
+            value = bs.read_u64()[0]
+        elif value_type == BINType.F32:
+            value = bs.read_f32()[0]
+        elif value_type == BINType.Vec2:
+            value = bs.read_vec2()[0]
+        elif value_type == BINType.Vec3:
+            value = bs.read_vec3()[0]
+        elif value_type == BINType.Vec4:
+            value = bs.read_vec4()[0]
+        elif value_type == BINType.Mtx4:
+            value = bs.read_mtx4()[0]
+        elif value_type == BINType.RGBA:
+            value = bs.read_u8(4)
+        elif value_type == BINType.String:
+            size, = bs.read_u16()
+            value = bs.read_a(size)[0]
+        elif value_type == BINType.Hash:
+            value, = bs.read_u32()
+            if not int_hashes:
+                value = hash_to_hex(value)
+        elif value_type == BINType.File:
+            value = bs.read_u64()[0]
+        elif value_type == BINType.Pointer or value_type == BINType.Embed:
+            field = BINField()
+            field.offset = bs.tell()
+            hash_type, = bs.read_u32()
+            field.hash_type = hash_type if int_hashes else hash_to_hex(
+                hash_type)
+            if hash_type != 0:
+                field.type = value_type
+                bs.pad(4)  # size
+                count, = bs.read_u16()
+                field.data = [
+                    IfElifBINHelper.read_field(bs, int_hashes)
+                    for i in range(count)
+                ]
+            else:
+                field.data = None
+            value = field
+        elif value_type == BINType.Link:
+            value, = bs.read_u32()
+            if not int_hashes:
+                value = hash_to_hex(value)
+        elif value_type == BINType.Flag:
+            value = bs.read_u8()[0]
+        return value
+
+    @staticmethod
+    def read_field(bs, int_hashes=False):
+        field = BINField()
+        field.offset = bs.tell()
+        field.hash, = bs.read_u32()
+        if not int_hashes:
+            field.hash = hash_to_hex(field.hash)
+        field.type = IfElifBINHelper.fix_type(bs.read_u8()[0])
+        if field.type == BINType.List or field.type == BINType.List2:
+            field.value_type = IfElifBINHelper.fix_type(bs.read_u8()[0])
+            bs.pad(4)  # size
+            count, = bs.read_u32()
+            field.data = [
+                IfElifBINHelper.read_value(bs, field.value_type, int_hashes)
+                for i in range(count)
+            ]
+        elif field.type == BINType.Pointer or field.type == BINType.Embed:
+            hash_type, = bs.read_u32()
+            field.hash_type = hash_type if int_hashes else hash_to_hex(
+                hash_type)
+            if hash_type != 0:
+                bs.pad(4)  # size
+                count, = bs.read_u16()
+                field.data = [
+                    IfElifBINHelper.read_field(bs, int_hashes)
+                    for i in range(count)
+                ]
+            else:
+                field.data = None
+        elif field.type == BINType.Option:
+            field.value_type = IfElifBINHelper.fix_type(bs.read_u8()[0])
+            count, = bs.read_u8()
+            if count != 0:
+                field.data = IfElifBINHelper.read_value(
+                    bs, field.value_type, int_hashes)
+            else:
+                field.data = None
+        elif field.type == BINType.Map:
+            field.key_type = IfElifBINHelper.fix_type(bs.read_u8()[0])
+            field.value_type = IfElifBINHelper.fix_type(bs.read_u8()[0])
+            bs.pad(4)  # size
+            count, = bs.read_u32()
+            field.data = {
+                IfElifBINHelper.read_value(bs, field.key_type, int_hashes): IfElifBINHelper.read_value(bs, field.value_type, int_hashes)
+                for i in range(count)
+            }
+        else:
+            field.data = IfElifBINHelper.read_value(bs, field.type, int_hashes)
+        return field
+
+    @staticmethod
+    def write_value(bs, value, value_type, header_size):
+        value_size = 5 if header_size else 0
+        if value_type == BINType.Empty:
+            bs.write_u16(*value)
+        elif value_type == BINType.Bool:
+            bs.write_b(value)
+            value_size += 1
+        elif value_type == BINType.I8:
+            bs.write_i8(value)
+            value_size += 1
+        elif value_type == BINType.U8:
+            bs.write_u8(value)
+            value_size += 1
+        elif value_type == BINType.I16:
+            bs.write_i16(value)
+            value_size += 2
+        elif value_type == BINType.U16:
+            bs.write_u16(value)
+            value_size += 2
+        elif value_type == BINType.I32:
+            bs.write_i32(value)
+            value_size += 4
+        elif value_type == BINType.U32:
+            bs.write_u32(value)
+            value_size += 4
+        elif value_type == BINType.I64:
+            bs.write_i64(value)
+            value_size += 8
+        elif value_type == BINType.U64:
+            bs.write_u64(value)
+            value_size += 8
+        elif value_type == BINType.F32:
+            bs.write_f32(value)
+            value_size += 4
+        elif value_type == BINType.Vec2:
+            bs.write_vec2(value)
+            value_size += 8
+        elif value_type == BINType.Vec3:
+            bs.write_vec3(value)
+            value_size += 12
+        elif value_type == BINType.Vec4:
+            bs.write_vec4(value)
+            value_size += 16
+        elif value_type == BINType.Mtx4:
+            bs.write_mtx4(value)
+            value_size += 64
+        elif value_type == BINType.RGBA:
+            bs.write_u8(*value)
+            value_size += 4
+        elif value_type == BINType.String:
+            size = len(value)
+            bs.write_u16(size)
+            bs.write_a(value)
+            value_size += size + 2
+        elif value_type == BINType.Hash:
+            bs.write_u32(name_or_hex_to_hash(value))
+            value_size += 4
+        elif value_type == BINType.File:
+            bs.write_u64(value)
+            value_size += 8
+        elif value_type == BINType.Pointer or value_type == BINType.Embed:
+            field = value  # treat the value as BINField
+            hash_type = name_or_hex_to_hash(field.hash_type)
+            if hash_type == 0:
+                bs.write_u32(0)
+                value_size += 4
+            else:
+                bs.write_u32(hash_type)
+                value_size += 4
+
+                size_slot = bs.reserve_u32()  # size
+                value_size += 4
+
+                content_size = 2
+                bs.write_u16(len(field.data))
+                for value in field.data:
+                    content_size += IfElifBINHelper.write_field(
+                        bs, value, header_size=True)
+                bs.fill_u32(size_slot, content_size)
+
+                value_size += content_size
+        elif value_type == BINType.Link:
+            bs.write_u32(name_or_hex_to_hash(value))
+            value_size += 4
+        elif value_type == BINType.Flag:
+            bs.write_u8(value)
+            value_size += 1
+        return value_size
+
+    @staticmethod
+    def write_field(bs, field, header_size):
+        field_size = 5 if header_size else 0
+        bs.write_u32(name_or_hex_to_hash(field.hash))
+        bs.write_u8(field.type.value)
+        if field.type == BINType.List or field.type == BINType.List2:
+            bs.write_u8(field.value_type.value)
+
+            size_slot = bs.reserve_u32()  # values size
+            field_size += 1 + 4
+
+            content_size = 4
+            bs.write_u32(len(field.data))
+            for value in field.data:
+                content_size += IfElifBINHelper.write_value(bs,
+                                                      value, field.value_type, header_size=False)
+            bs.fill_u32(size_slot, content_size)
+
+            field_size += content_size
+        elif field.type == BINType.Pointer or field.type == BINType.Embed:
+            hash_type = name_or_hex_to_hash(field.hash_type)
+            if hash_type == 0:
+                bs.write_u32(0)  # hash_type
+                field_size += 4
+            else:
+                bs.write_u32(hash_type)
+                field_size += 4
+
+                size_slot = bs.reserve_u32()  # values size
+                field_size += 4
+
+                content_size = 2
+                bs.write_u16(len(field.data))
+                for value in field.data:
+                    content_size += IfElifBINHelper.write_field(
+                        bs, value, header_size=True)
+                bs.fill_u32(size_slot, content_size)
+
+                field_size += content_size
+        elif field.type == BINType.Option:
+            bs.write_u8(field.value_type.value)
+            count = 0 if field.data == None else 1
+            bs.write_u8(count)
+            field_size += 1 + 1
+            if count != 0:
+                field_size += IfElifBINHelper.write_value(bs,
+                                                    field.data, field.value_type, header_size=False)
+        elif field.type == BINType.Map:
+            bs.write_u8(
+                field.key_type.value,
+                field.value_type.value
+            )
+
+            size_slot = bs.reserve_u32()  # size
+            field_size += 1+1+4
+
+            content_size = 4
+            bs.write_u32(len(field.data))
+            for key, value in field.data.items():
+                content_size += IfElifBINHelper.write_value(bs,
+                                                      key, field.key_type, header_size=False)
+                content_size += IfElifBINHelper.write_value(bs,
+                                                      value, field.value_type, header_size=False)
+            bs.fill_u32(size_slot, content_size)
+
+            field_size += content_size
+        else:
+            field_size += IfElifBINHelper.write_value(bs,
+                                                field.data, field.type, header_size=False)
+        return field_size
+
+
+def bench_write(helper, fields):
+    bs = BinWriter()
+    start = perf_counter()
+    for field in fields:
+        helper.write_field(bs, field, header_size=True)
+    return perf_counter() - start, bs.raw()
+
+
+def bench_read(helper, data, field_count):
+    bs = BinReader(data)
+    start = perf_counter()
+    for i in range(field_count):
+        helper.read_field(bs)
+    return perf_counter() - start
+
+
+def without_lists(fields):
+    # copy of the fields without List/List2, embeds and pointers filtered too
+    result = []
+    for field in fields:
+        if field.type in (BINType.List, BINType.List2):
+            continue
+        if field.type in (BINType.Embed, BINType.Pointer) and field.data != None:
+            copy = BINField()
+            copy.hash, copy.type, copy.hash_type = field.hash, field.type, field.hash_type
+            copy.data = without_lists(field.data)
+            field = copy
+        result.append(field)
+    return result
+
+
+def read_fields(data):
+    bin_file = BIN()
+    bin_file.read('', raw=data)
+    return [field for entry in bin_file.entries for field in entry.data]
+
+
+if __name__ == '__main__':
+    if len(argv) > 1:
+        fields = []
+        for bin_path in argv[1:]:
+            with open(bin_path, 'rb') as f:
+                fields += read_fields(f.read())
+    else:
+        fields = read_fields(make_bin())
+    for title, bench_fields in (('all fields', fields), ('without List/List2', without_lists(fields))):
+        field_count = count_fields(bench_fields)
+        print(f'{title}: {field_count} fields')
+        results = {}
+        for name, helper in (('if/elif', IfElifBINHelper), ('tables', BINHelper)):
+            write_time, data = min(bench_write(helper, bench_fields) for i in range(5))
+            read_time = min(bench_read(helper, data, len(bench_fields)) for i in range(5))
+            results[name] = data
+            print(f'  {name:8} {len(data)/1024/1024:.1f} MB: '
+                  f'read_field {read_time/field_count*1e9:.0f} ns/field, '
+                  f'write_field {write_time/field_count*1e9:.0f} ns/field')
+        if results['if/elif'] != results['tables']:
+            print('  outputs are different')
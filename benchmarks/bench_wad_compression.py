@@ -0,0 +1,55 @@
+"""
+WAD.write_chunks output size and time for each compression policy,
+over texture-like, incompressible and small bin chunk datas.
+python -m benchmarks.bench_wad_compression [chunk_count]
+"""
+from random import Random
+from sys import argv
+from time import perf_counter
+from LtMAO.wadfile import WAD, WADChunk, WADCompressionPolicy, WADCompressionRule
+from benchmarks.synthetic import make_bin, make_wad_datas
+
+policies = {
+    'default': None,
+    'zstd 1': WADCompressionPolicy(default=WADCompressionRule(level=1)),
+    'zstd 9': WADCompressionPolicy(default=WADCompressionRule(level=9)),
+    'zstd 19': WADCompressionPolicy(default=WADCompressionRule(level=19)),
+    'zstd 3, raw if larger': WADCompressionPolicy(default=WADCompressionRule(level=3, raw_if_larger=True)),
+    'zstd 1, bins 19': WADCompressionPolicy(
+        [(('bin',), None, WADCompressionRule(level=19))],
+        WADCompressionRule(level=1, raw_if_larger=True)
+    ),
+    'raw': WADCompressionPolicy(default=WADCompressionRule('raw')),
+}
+
+
+def make_datas(chunk_count, seed=0):
+    rand = Random(seed)
+    datas = make_wad_datas(chunk_count // 2, seed=seed)
+    # audio-like, already compressed
+    datas += [b'OggS' + rand.randbytes(128 * 1024) for i in range(chunk_count // 4)]
+    # small bins
+    datas += [make_bin(20, seed=i) for i in range(chunk_count - len(datas))]
+    return datas
+
+
+def bench(datas, policy):
+    wad = WAD()
+    wad.chunks = [WADChunk.default() for _ in datas]
+    chunk_hashes = [f'{i+1:016x}' for i in range(len(datas))]
+    start = perf_counter()
+    with wad.stream('', 'rb+', raw=wad.write('', raw=True)) as bs:
+        wad.write_chunks(bs, chunk_hashes, datas, policy=policy)
+        data = bs.raw()
+    return perf_counter() - start, len(data)
+
+
+if __name__ == '__main__':
+    chunk_count = int(argv[1]) if len(argv) > 1 else 128
+    datas = make_datas(chunk_count)
+    size = sum(len(data) for data in datas)
+    print(f'{len(datas)} chunks, {size/1024/1024:.1f} MB')
+    for name, policy in policies.items():
+        elapsed, output_size = bench(datas, policy)
+        print(f'{name:24} {output_size/1024/1024:7.2f} MB ({output_size/size*100:5.1f}%) '
+              f'{elapsed*1000:8.0f} ms')
@@ -0,0 +1,38 @@
+"""
+WAD.write_chunks time with the compression done serially and on
+thread / process pools of increasing size, outputs must be identical.
+python -m benchmarks.bench_wad_write [chunk_count] [max_workers]
+"""
+from os import cpu_count
+from sys import argv
+from time import perf_counter
+from LtMAO.wadfile import WAD, WADChunk
+from benchmarks.synthetic import make_wad_datas
+
+
+def bench(datas, **kwargs):
+    wad = WAD()
+    wad.chunks = [WADChunk.default() for _ in datas]
+    chunk_hashes = [f'{i+1:016x}' for i in range(len(datas))]
+    start = perf_counter()
+    with wad.stream('', 'rb+', raw=wad.write('', raw=True)) as bs:
+        wad.write_chunks(bs, chunk_hashes, datas, **kwargs)
+        data = bs.raw()
+    return perf_counter() - start, data
+
+
+if __name__ == '__main__':
+    chunk_count = int(argv[1]) if len(argv) > 1 else 256
+    max_workers = int(argv[2]) if len(argv) > 2 else (cpu_count() or 1)
+    datas = make_wad_datas(chunk_count)
+    size = sum(len(data) for data in datas) / 1024 / 1024
+    serial, expected = bench(datas)
+    print(f'serial           {size:.0f} MB: {serial*1000:.0f} ms')
+    workers = 2
+    while workers <= max_workers:
+        for name, processes in (('threads', False), ('processes', True)):
+            elapsed, data = bench(datas, workers=workers, processes=processes)
+            assert data == expected, f'{name} x {workers} output differs'
+            print(f'{name:9} x {workers:<4} {size:.0f} MB: {elapsed*1000:.0f} ms, '
+                  f'{serial/elapsed:.1f}x')
+        workers *= 2
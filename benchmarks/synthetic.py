@@ -0,0 +1,114 @@
+"""
+Synthetic skin / map BIN builder for the benchmarks, no game files needed.
+Run benchmarks from the repo root: python -m benchmarks.<name>
+"""
+from random import Random
+from LtMAO.binfile import BIN, BINEntry, BINField, BINType, name_to_hex
+from LtMAO.binstream import Vector
+
+
+def make_field(name, field_type, data, **kwargs):
+    field = BINField()
+    field.hash = name_to_hex(name)
+    field.type = field_type
+    field.data = data
+    for key, value in kwargs.items():
+        setattr(field, key, value)
+    return field
+
+
+def make_fields(rand, depth=0):
+    fields = []
+    for i in range(rand.randint(4, 10)):
+        name = f'field{depth}_{i}'
+        kind = rand.randrange(12 if depth < 2 else 9)
+        if kind == 0:
+            fields.append(make_field(name, BINType.F32, rand.random()))
+        elif kind == 1:
+            fields.append(make_field(name, BINType.U8, rand.randrange(256)))
+        elif kind == 2:
+            fields.append(make_field(
+                name, BINType.String, f'ASSETS/Shared/Particles/{name}.dds'))
+        elif kind == 3:
+            fields.append(make_field(
+                name, BINType.Hash, name_to_hex(f'hash{rand.randrange(999)}')))
+        elif kind == 4:
+            fields.append(make_field(
+                name, BINType.Link, name_to_hex(f'link{rand.randrange(999)}')))
+        elif kind == 5:
+            fields.append(make_field(name, BINType.Vec3, Vector(1.0, 2.0, 3.0)))
+        elif kind == 6:
+            fields.append(make_field(name, BINType.List, [
+                rand.random() for j in range(rand.randrange(32))], value_type=BINType.F32))
+        elif kind == 7:
+            fields.append(make_field(name, BINType.List, [
+                Vector(rand.random(), 0.0, 1.0) for j in range(rand.randrange(64))], value_type=BINType.Vec3))
+        elif kind == 8:
+            fields.append(make_field(name, BINType.Map, {
+                name_to_hex(f'key{j}'): rand.random() for j in range(rand.randrange(8))
+            }, key_type=BINType.Hash, value_type=BINType.F32))
+        elif kind == 9:
+            fields.append(make_field(name, BINType.Embed, make_fields(
+                rand, depth+1), hash_type=name_to_hex(f'Type{depth}')))
+        elif kind == 10:
+            fields.append(make_field(name, BINType.Pointer, make_fields(
+                rand, depth+1), hash_type=name_to_hex(f'Pointer{depth}')))
+        else:
+            values = []
+            for j in range(rand.randrange(4)):
+                value = BINField()
+                value.type = BINType.Embed
+                value.hash_type = name_to_hex('ListItem')
+                value.data = make_fields(rand, depth+1)
+                values.append(value)
+            fields.append(make_field(
+                name, BINType.List2, values, value_type=BINType.Embed))
+    return fields
+
+
+def make_bin(entry_count=2000, seed=0):
+    rand = Random(seed)
+    bin_file = BIN()
+    bin_file.links = ['DATA/Characters/Annie/Annie.bin']
+    for i in range(entry_count):
+        entry = BINEntry()
+        entry.type = name_to_hex('VfxSystemDefinitionData')
+        entry.hash = name_to_hex(f'Characters/Annie/Skins/Skin0/Particles/{i}')
+        entry.data = make_fields(rand)
+        bin_file.entries.append(entry)
+    skin = BINEntry()
+    skin.type = name_to_hex('SkinCharacterDataProperties')
+    skin.hash = name_to_hex('Characters/Annie/Skins/Skin0')
+    skin.data = make_fields(rand) + [
+        make_field('HealthBarData', BINType.Embed, [
+            make_field('UnitHealthBarStyle', BINType.U8, 9)
+        ], hash_type=name_to_hex('CharacterHealthBarDataRecord'))
+    ]
+    bin_file.entries.insert(entry_count // 2, skin)
+    return bin_file.write('', raw=True)
+
+
+def count_fields(fields):
+    count = 0
+    for field in fields:
+        count += 1
+        if field.type in (BINType.Embed, BINType.Pointer) and field.data != None:
+            count += count_fields(field.data)
+        elif field.type in (BINType.List, BINType.List2) and field.value_type in (BINType.Embed, BINType.Pointer):
+            for value in field.data:
+                if value.data != None:
+                    count += count_fields(value.data)
+    return count
+
+
+def make_wad_datas(chunk_count, chunk_size=256 * 1024, seed=0):
+    # texture-like chunk datas: a random block repeated with noise, compresses ~3x
+    rand = Random(seed)
+    datas = []
+    for i in range(chunk_count):
+        block = rand.randbytes(4096)
+        data = bytearray(block * (chunk_size // 4096))
+        for j in range(0, len(data), 97):
+            data[j] = rand.randrange(256)
+        datas.append(b'DDS ' + bytes(data))
+    return datas
@@ -3,26 +3,76 @@ try:
     Input can be either a folder or a .wad.client file or a .bin file
     Or even a fantome UwU
     """
-    from io import BytesIO
-    from sys import argv
-    from os import path
-    from zipfile import ZIP_DEFLATED, ZipFile
-    from LtMAO.binfile import BIN, BINField, BINType
-    from LtMAO.wadfile import WAD, WADChunk
+    from io import StringIO
+    from copy import copy
+    from struct import unpack
+    from sys import argv, version_info
+    from platform import python_implementation
+    from shutil import copyfileobj
+    from os import path, cpu_count, remove, replace, stat, getpid, makedirs, environ
+    from threading import Lock
+    from time import time_ns
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+    from concurrent.futures.process import BrokenProcessPool
+    from contextlib import redirect_stdout
+    from multiprocessing import freeze_support
+    import sqlite3
+    import json
+    import atexit
+    from xxhash import xxh3_64, xxh3_128
+    from zipfile import ZIP_DEFLATED, ZipFile, ZipInfo
+    from LtMAO.binfile import BIN, BINEditor, BINField, BINType
+    from LtMAO.wadfile import WAD, WADChunk, WADCompressionPolicy, WADCompressionRule
 
 
     HEALTHBAR_NUMBER = 11
+    WAD_WORKERS = cpu_count() or 1 # workers reading, fixing and compressing the wad chunks
+    # the bins of a wad are fixed on WAD_WORKERS processes, the bin parse is pure python
+    # so on threads only the decompression runs in parallel, the folder mode uses no pool inside its processes
+    WAD_PROCESSES = True
+    # fixed .wad.client files get the new bins appended and their toc updated instead of being rewritten,
+    # WAD_COMPACT rewrites them after to remove the old bins
+    WAD_PATCH_IN_PLACE = True
+    WAD_COMPACT = False
+    WAD_COMPRESSION = None # WADCompressionPolicy of the written chunks, None copies the chunks not fixed and zstd the fixed bins
+    # only fix the skin bins at SKIN_BIN_PATHS instead of checking every chunk of a wad,
+    # the champion is the wad name (Annie.wad.client -> annie) and the ones in SKIN_BIN_CHAMPIONS
+    SKIN_BIN_TARGETED = False
+    SKIN_BIN_PATHS = ['data/characters/{champion}/skins/skin{skin}.bin']
+    SKIN_BIN_RANGE = range(100)
+    SKIN_BIN_CHAMPIONS = [] # like annietibbers
+    # the subchunk toc of a wad is found by its path, {wad} is the wad name (Annie.wad.client -> annie.wad),
+    # a wad inside a game folder uses its own path from data/final first
+    # and the toc is guessed from the chunk sizes if none of them is in the wad
+    SUBCHUNK_TOC_PATHS = ['data/final/champions/{wad}.subchunktoc', 'data/final/maps/shipping/{wad}.subchunktoc']
+    # folder mode fixes DIR_WORKERS files at the same time, biggest first, with at most DIR_MAX_BYTES of files in flight
+    DIR_WORKERS = cpu_count() or 1
+    DIR_MAX_BYTES = 2 * 1024 * 1024 * 1024
+    # folder mode skips the files that didnt change since they were fixed, using this manifest inside the folder
+    DIR_MANIFEST = 'healthbar_fix_manifest.sqlite' # None to fix every file
+    # fantome members that didnt change are copied without recompressing them through ZipFile internals,
+    # on the CPython versions checked with, the others recompress them
+    ZIP_RAW_COPY_VERSIONS = ((3, 8), (3, 13))
+    # fixed bins are cached by their content in the user cache folder, the least recently used past BIN_CACHE_MAX_BYTES are removed
+    BIN_CACHE_PATH = path.join(environ.get('LOCALAPPDATA') or environ.get('XDG_CACHE_HOME') or path.join(path.expanduser('~'), '.cache'),
+                               'healthbar_fix', 'healthbar_fix_cache.sqlite') # None to not cache
+    # part of the cache key, bump it when parse_bin changes what it writes so the old fixed bins are not used
+    BIN_FIXER_VERSION = 1
+    BIN_CACHE_MAX_BYTES = 256 * 1024 * 1024
+    BIN_CACHE_ROW_BYTES = 256 # cost of a row on top of its data
+    BIN_CACHE_USED_BATCH = 256 # cache hit times are written this many at once
     def compute_hash(s: str):
         """
-        Generaters FN1a lowered hash from a string
+        Generaters FN1a lowered hash from a string, as int like the bins are read
         """
         if s.startswith("0x"):
-            return s.removeprefix("0x")
+            return int(s, 16)
         
         h = 0x811c9dc5 
         for b in s.encode('ascii').lower(): 
             h = ((h ^ b) * 0x01000193) % 0x100000000 
-        return f"{h:08x}"
+        return h
 
 
     class CACHED_BIN_HASHES(dict):
@@ -38,14 +88,74 @@ try:
 
 
     BIN_HASH = CACHED_BIN_HASHES()
-   
-    if len(argv) != 2:
-        input('Make sure to drag and drop something into the .exe!')
-        exit()
 
-    inpt = argv[1].lower()
 
-    def parse_bin(bin_file: BIN) -> BIN:
+    def file_fingerprint(file_path: str) -> tuple:
+        """
+        (size, mtime, xxh3 hex) of a file
+        """
+        file_stat = stat(file_path)
+        h = xxh3_64()
+        with open(file_path, 'rb') as f:
+            while block := f.read(1024 * 1024):
+                h.update(block)
+        return file_stat.st_size, file_stat.st_mtime_ns, h.hexdigest()
+
+
+    class FILE_MANIFEST:
+        """
+        Fingerprints of the fixed files of a folder, stored in a sqlite file
+        The files with the same size and mtime, or the same content, are not fixed again
+        """
+        def __init__(self, folder: str):
+            self.folder = folder
+            self.db = sqlite3.connect(path.join(folder, DIR_MANIFEST))
+            self.db.execute('CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, hash TEXT, healthbar INTEGER)')
+
+        def close(self):
+            self.db.close()
+
+        def changed(self, file_paths: list) -> list:
+            """
+            The files that need to be fixed
+            """
+            changed_paths = []
+            for file_path in file_paths:
+                row = self.db.execute('SELECT size, mtime, hash, healthbar FROM files WHERE path = ?', (path.relpath(file_path, self.folder),)).fetchone()
+                if row == None or row[3] != HEALTHBAR_NUMBER:
+                    changed_paths.append(file_path)
+                    continue
+                file_stat = stat(file_path)
+                if (file_stat.st_size, file_stat.st_mtime_ns) == row[:2]:
+                    continue
+                # touched or copied, check the content
+                fingerprint = file_fingerprint(file_path)
+                if fingerprint[2] == row[2]:
+                    self.add(file_path, fingerprint)
+                else:
+                    changed_paths.append(file_path)
+            self.db.commit()
+            return changed_paths
+
+        def add(self, file_path: str, fingerprint: tuple):
+            self.db.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)', (path.relpath(file_path, self.folder), *fingerprint, HEALTHBAR_NUMBER))
+
+        def add_result(self, result: tuple):
+            """
+            Adds the file of a fix_file result if it was fixed without exception,
+            committed right away so an interrupted run keeps the files done
+            """
+            file_path, log, exception, fingerprint, changes = result
+            if exception == None:
+                self.add(file_path, fingerprint)
+                self.db.commit()
+
+    def parse_bin(bin_file: BIN, editor: BINEditor) -> list:
+        """
+        Adds the edits to the editor, returns the changes as (entry hash, field name, old value, new value)
+        old value is None for the appended fields
+        """
+        changes = []
         UnitHealthBarStyle = BINField()
         UnitHealthBarStyle.hash = BIN_HASH["UnitHealthBarStyle"]
         UnitHealthBarStyle.type = BINType.U8
@@ -63,7 +173,8 @@ try:
 
                 if not has_healthbardata_flag:
                     # Appending a HealthBarData to SkinCharacterData
-                    entry.data.append(HealthBarData)
+                    editor.append_field(HealthBarData, entry)
+                    changes.append((entry.hash, 'HealthBarData', None, HEALTHBAR_NUMBER))
                     print("Fixed by appending one HealthBarData with UnitHealthBarStyle inside UwU!")
                 else:
                     for s_property in entry.data:
@@ -73,222 +184,601 @@ try:
                             if has_unithealth_flag:
                                 for inside_healthbar in s_property.data:
                                     if inside_healthbar.hash == BIN_HASH["UnitHealthBarStyle"]:
+                                        if inside_healthbar.data == HEALTHBAR_NUMBER:
+                                            print(f"The value is already {HEALTHBAR_NUMBER} UwU!")
+                                            continue
                                         print(f"Just changed the value from {inside_healthbar.data} to {HEALTHBAR_NUMBER} UwU!")
-                                        inside_healthbar.data = HEALTHBAR_NUMBER # WoW magic changed the value to HEALTHBAR_NUMBER omfg
+                                        changes.append((entry.hash, 'UnitHealthBarStyle', inside_healthbar.data, HEALTHBAR_NUMBER))
+                                        editor.set_value(inside_healthbar, HEALTHBAR_NUMBER) # WoW magic changed the value to HEALTHBAR_NUMBER omfg
                             else:
                                 # Wtf you have HealthBarData but dont have UnitHealthBarStyle?
-                                s_property.data.append(UnitHealthBarStyle)
+                                editor.append_field(UnitHealthBarStyle, entry, s_property)
+                                changes.append((entry.hash, 'UnitHealthBarStyle', None, HEALTHBAR_NUMBER))
                                 print("Fixed one HealthBarData that didn't have UnitHealthBarStyle UwU!")
-        return bin_file
+        return changes
 
-    def parse_wad(wad_path: str) -> bytes:
-        wad_file = WAD()
-        wad_file.read(wad_path)
+    class BIN_CACHE:
+        """
+        Fixed bins by the xxh3 of the original bin, HEALTHBAR_NUMBER and BIN_FIXER_VERSION, stored in a sqlite file
+        Bins that didnt need a fix are stored without data, every row counts BIN_CACHE_ROW_BYTES more toward BIN_CACHE_MAX_BYTES
+        The cache is only an optimization, its sqlite errors are ignored
+        """
+        def __init__(self, cache_path: str):
+            self.lock = Lock()
+            makedirs(path.dirname(cache_path), exist_ok=True)
+            self.db = sqlite3.connect(cache_path, timeout=60, check_same_thread=False)
+            self.db.execute('PRAGMA journal_mode=WAL')
+            create_table = 'CREATE TABLE IF NOT EXISTS bins (hash TEXT, healthbar INTEGER, fixer INTEGER, data BLOB, changes TEXT, size INTEGER, used INTEGER, PRIMARY KEY (hash, healthbar, fixer))'
+            self.db.execute(create_table)
+            if [column[1] for column in self.db.execute('PRAGMA table_info(bins)')] != ['hash', 'healthbar', 'fixer', 'data', 'changes', 'size', 'used']:
+                # made by an older script, its only a cache
+                self.db.execute('DROP TABLE bins')
+                self.db.execute(create_table)
+            self.db.execute('CREATE INDEX IF NOT EXISTS bins_used ON bins (used)')
+            self.db.commit()
+            # running total of the sizes, the other processes add theirs too so its checked again before removing rows
+            self.total = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM bins').fetchone()[0]
+            # {hash: time} of the cache hits, written with the next put or flush
+            self.used = {}
+
+        def get(self, bin_hash: str) -> tuple:
+            """
+            (cached, fixed bin or None if the bin didnt need a fix, parse_bin changes)
+            """
+            with self.lock:
+                try:
+                    row = self.db.execute('SELECT data, changes FROM bins WHERE hash = ? AND healthbar = ? AND fixer = ?', (bin_hash, HEALTHBAR_NUMBER, BIN_FIXER_VERSION)).fetchone()
+                except sqlite3.Error:
+                    return False, None, []
+                if row == None:
+                    return False, None, []
+                self.used[bin_hash] = time_ns()
+                if len(self.used) >= BIN_CACHE_USED_BATCH:
+                    self.write_used()
+            return True, row[0], [tuple(change) for change in json.loads(row[1])]
+
+        def put(self, bin_hash: str, data: bytes, changes: list):
+            size = BIN_CACHE_ROW_BYTES + (len(data) if data != None else 0)
+            with self.lock:
+                try:
+                    self.db.execute('INSERT OR REPLACE INTO bins VALUES (?, ?, ?, ?, ?, ?, ?)', (bin_hash, HEALTHBAR_NUMBER, BIN_FIXER_VERSION, data, json.dumps(changes), size, time_ns()))
+                    self.total += size
+                    # the pending hits first, so the bins just used are not removed by their old times
+                    self.write_used()
+                    if self.total > BIN_CACHE_MAX_BYTES:
+                        self.remove_least_used()
+                        self.db.commit()
+                except sqlite3.Error:
+                    self.db.rollback()
+
+        def remove_least_used(self):
+            """
+            Removes the least recently used rows down to 3/4 of BIN_CACHE_MAX_BYTES, so it doesnt happen on every put
+            """
+            self.total = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM bins').fetchone()[0]
+            excess = self.total - BIN_CACHE_MAX_BYTES * 3 // 4
+            if self.total <= BIN_CACHE_MAX_BYTES or excess <= 0:
+                return
+            removed, last_used = 0, None
+            for used, size in self.db.execute('SELECT used, size FROM bins ORDER BY used').fetchall():
+                removed += size
+                last_used = used
+                if removed >= excess:
+                    break
+            self.db.execute('DELETE FROM bins WHERE used <= ?', (last_used,))
+            self.total -= removed
+
+        def write_used(self):
+            """
+            Writes the pending cache hit times and commits, called with the lock held
+            """
+            try:
+                self.db.executemany('UPDATE bins SET used = ? WHERE hash = ? AND healthbar = ? AND fixer = ?', ((used, bin_hash, HEALTHBAR_NUMBER, BIN_FIXER_VERSION) for bin_hash, used in self.used.items()))
+                self.db.commit()
+            except sqlite3.Error:
+                self.db.rollback()
+            self.used.clear()
+
+        def flush(self):
+            with self.lock:
+                self.write_used()
+
+
+    bin_cache, bin_cache_pid = None, None
+    bin_cache_lock = Lock()
+    def get_bin_cache() -> BIN_CACHE:
+        """
+        The BIN_CACHE of this process, None if BIN_CACHE_PATH is None or it cant be opened
+        """
+        global bin_cache, bin_cache_pid
+        if BIN_CACHE_PATH == None:
+            return None
+        with bin_cache_lock:
+            if bin_cache_pid != getpid():
+                bin_cache_pid = getpid()
+                try:
+                    bin_cache = BIN_CACHE(BIN_CACHE_PATH)
+                except (sqlite3.Error, OSError) as e:
+                    print(f"Can't open the bin cache, fixing without it: {e}")
+                    bin_cache = None
+        return bin_cache
+
+    def flush_bin_cache():
+        """
+        Writes the pending cache hit times of this process
+        """
+        if bin_cache != None and bin_cache_pid == getpid():
+            bin_cache.flush()
+
+    def fix_bin(bin_bytes: bytes) -> tuple:
+        """
+        Fixes the bin, or gets it from the cache if the same bin was fixed before
+        Returns (fixed bin or None if the bin didnt need a fix, parse_bin changes)
+        """
+        # most bins have no skin entry or are fixed already,
+        # only the skin entries are read to know it, without hashing the bin for the cache
+        skin_entries = BIN.find_entries(bin_bytes, [BIN_HASH["SkinCharacterDataProperties"]], int_hashes=True)
+        if all(healthbar_fixed(entry.data) for entry in skin_entries):
+            return None, []
+        cache = get_bin_cache()
+        if cache == None:
+            return splice_bin(bin_bytes)
+        bin_hash = xxh3_128(bin_bytes).hexdigest()
+        cached, fixed_bytes, changes = cache.get(bin_hash)
+        if cached:
+            print("Bin checked before, using the cached one UwU!")
+            return fixed_bytes, changes
+        fixed_bytes, changes = splice_bin(bin_bytes)
+        cache.put(bin_hash, fixed_bytes, changes)
+        return fixed_bytes, changes
+
+    def healthbar_fixed(entry_data: list) -> bool:
+        """
+        True if parse_bin has nothing to change in this SkinCharacterDataProperties
+        """
+        healthbars = [i for i in entry_data if i.hash_type == BIN_HASH["CharacterHealthBarDataRecord"]]
+        return len(healthbars) > 0 and all(
+            any(i.hash == BIN_HASH["UnitHealthBarStyle"] for i in s_property.data) and
+            all(i.data == HEALTHBAR_NUMBER for i in s_property.data if i.hash == BIN_HASH["UnitHealthBarStyle"])
+            for s_property in healthbars
+        )
+
+    def splice_bin(bin_bytes: bytes) -> tuple:
+        """
+        Fixes the bin by splicing the edits into the original bytes, fix_bin checks first if it needs it
+        Returns (fixed bin or None if the bin didnt need a fix, parse_bin changes)
+        """
+        bin_file = BIN()
+        bin_file.read(path='', raw=bin_bytes, lazy=True, int_hashes=True)
+        editor = BINEditor(bin_file, bin_bytes)
+        changes = parse_bin(bin_file, editor)
+        if not changes:
+            return None, changes
+        return editor.apply(), changes
+
+    def format_change(where: str, change: tuple) -> str:
+        """
+        One line of a change report, where is the bin it was made in
+        """
+        entry_hash, field_name, old_value, new_value = change
+        return f"{where}: entry {entry_hash:08x} {field_name} {'added' if old_value == None else old_value} -> {new_value}"
+
+    def parse_bin_file(bin_path: str) -> list:
+        """
+        Fixes the bin file, returns the changes as (bin path, parse_bin change)
+        """
+        with open(bin_path, 'rb') as f:
+            bin_bytes, changes = fix_bin(f.read())
+        if bin_bytes == None:
+            print("Nothing to fix in .bin file :D")
+        else:
+            print("Writing .bin file :D")
+            with open(bin_path, 'wb') as f:
+                f.write(bin_bytes)
+        return [(bin_path, change) for change in changes]
+
+    def fix_chunk(extension: str, chunk_data: bytes):
+        """
+        Fixes a wad chunk if its a bin, returns the fix_bin result or None if its not a bin
+        """
+        if extension == 'bin':
+            return fix_bin(chunk_data)
+        return None
+
+    def skin_bin_chunks(wad_file: WAD, wad_name: str) -> list:
+        """
+        Finds the skin bins of the champions by path hash, empty if the wad doesnt use SKIN_BIN_PATHS
+        """
+        champions = [path.basename(wad_name).split('.')[0].lower()] + SKIN_BIN_CHAMPIONS
+        return wad_file.find_chunks(
+            pattern.format(champion=champion, skin=skin)
+            for pattern in SKIN_BIN_PATHS
+            for champion in champions
+            for skin in SKIN_BIN_RANGE
+        )
+
+    def subchunk_toc_paths(wad_name: str) -> list:
+        """
+        Paths the subchunk toc of the wad can have, from SUBCHUNK_TOC_PATHS
+        """
+        wad_name = wad_name.replace('\\', '/').lower().removesuffix('.client')
+        paths = [pattern.format(wad=path.basename(wad_name)) for pattern in SUBCHUNK_TOC_PATHS]
+        index = wad_name.rfind('data/final/')
+        if index != -1:
+            paths.insert(0, wad_name[index:] + '.subchunktoc')
+        return paths
+
+    def fix_wad_chunks(wad_file: WAD, bs, wad_name: str) -> tuple:
+        """
+        Fixes the bins of the wad, returns ({chunk id: fixed data} of the changed ones, changes as ("wad name chunk hash", parse_bin change))
+        """
+        chunks = skin_bin_chunks(wad_file, wad_name) if SKIN_BIN_TARGETED else None
+        if not chunks:
+            # unknown layout, find the bins by their signature
+            chunks = None
+        wad_file.read_subchunk_toc(bs, subchunk_toc_paths(wad_name))
+        fixed_chunks, changes = {}, []
+        for chunk, result, exception in wad_file.transform_chunks(bs, fix_chunk, workers=WAD_WORKERS, processes=WAD_PROCESSES, extensions=('bin',), chunks=chunks):
+            if exception != None:
+                print(f'File Hash: "{chunk.hash}" THROWN AN EXCEPTION')
+            if result == None:
+                continue
+            fixed_data, chunk_changes = result
+            if fixed_data != None:
+                fixed_chunks[chunk.id] = fixed_data
+                changes += [(f'{wad_name} {chunk.hash}', change) for change in chunk_changes]
+        return fixed_chunks, changes
+
+    def rebuild_wad(wad_file: WAD, bs, fixed_chunks: dict, wad_path: str = None) -> bytes:
+        """
+        Rebuilds the wad, only the fixed bins are recompressed
+        and the other chunks are copied as they are
+        Streams it into wad_path if given, else returns the wad bytes
+        """
         chunk_datas = []
         chunk_hashes = []
-        with wad_file.stream(wad_path, 'rb+') as bs:
-            for chunk in wad_file.chunks:
-                chunk.read_data(bs)
-                if chunk.extension == 'bin':
-                    try:
-                        bin_file = BIN()
-                        bin_file.read(path='', raw=chunk.data)
-                        bin_file = parse_bin(bin_file)
-                        chunk.data = bin_file.write(path='', raw=True)
-                    except Exception:
-                        print(f'File Hash: "{chunk.hash}" THROWN AN EXCEPTION')
-                
-                chunk_datas.append(chunk.data)
-                chunk_hashes.append(chunk.hash)
+        for chunk in wad_file.chunks:
+            chunk_data = fixed_chunks.get(chunk.id)
+            if chunk_data == None:
+                chunk.read_raw(bs)
+                chunk_data = chunk
 
-        wad = WAD()
-        wad.chunks = [WADChunk.default() for _ in range(len(chunk_hashes))]
-        
-        with wad.stream('', 'rb+', raw=wad.write('', raw=True)) as bs:
-            for id, chunk in enumerate(wad.chunks):
-                chunk.write_data(bs, id, chunk_hashes[id], chunk_datas[id], previous_chunks=(
-                                    wad.chunks[i] for i in range(id)))
-                chunk.free_data()
-            final_bytes = bs.raw()
+            chunk_datas.append(chunk_data)
+            chunk_hashes.append(chunk.hash)
 
+        wad = WAD()
+        if wad_path != None:
+            wad.write_file(wad_path, chunk_hashes, chunk_datas, workers=WAD_WORKERS, policy=WAD_COMPRESSION)
+            final_bytes = None
+        else:
+            wad.chunks = [WADChunk.default() for _ in range(len(chunk_hashes))]
+            with wad.stream('', 'rb+', raw=wad.write('', raw=True)) as wad_bs:
+                wad.write_chunks(wad_bs, chunk_hashes, chunk_datas, workers=WAD_WORKERS, policy=WAD_COMPRESSION)
+                final_bytes = wad_bs.raw()
+        chunk_datas.clear()
+        for chunk in wad_file.chunks:
+            chunk.free_data()
         return final_bytes
 
-    def parse_fantome(fantome_path: str) -> None:
-        with open(fantome_path, 'rb') as file:
-            zip_file = ZipFile(file, 'r')
-            zip_name_list = zip_file.namelist()
+    def parse_wad(wad_path: str) -> list:
+        """
+        Fixes the wad file, patched in place or rewritten through a temporary file
+        Returns the changes (see fix_wad_chunks)
+        """
+        wad_file = WAD()
+        wad_file.read(wad_path, mapped=True)
+        temp_path = None
+        with wad_file.stream(wad_path, 'rb', mapped=True) as bs:
+            fixed_chunks, changes = fix_wad_chunks(wad_file, bs, wad_path)
+            if not fixed_chunks:
+                print("Nothing to fix in .wad file :D")
+                return changes
+            if not WAD_PATCH_IN_PLACE or int(wad_file.version) != 3 or wad_file.version < 3.1:
+                print("Writing .wad file :D")
+                # the temporary file is removed by WAD.write_file if it fails
+                temp_path = wad_path + '.tmp'
+                rebuild_wad(wad_file, bs, fixed_chunks, temp_path)
+
+        if temp_path != None:
+            replace(temp_path, wad_path)
+            return changes
+        print("Patching .wad file :D")
+        wad_file.patch(wad_path, fixed_chunks, policy=WAD_COMPRESSION)
+        if WAD_COMPACT:
+            print("Compacting .wad file :D")
+            wad_file.compact(wad_path)
+        return changes
 
-            has_bin_files_flag = False
-            bins_dict, final_bins_dict = {}, {}
+    def zip_raw_copy_supported(final_zip_file) -> bool:
+        """
+        True if copy_zip_member can be used, it writes into the ZipFile internals (fp, filelist, NameToInfo, start_dir)
+        so only on the CPython versions in ZIP_RAW_COPY_VERSIONS
+        """
+        return python_implementation() == 'CPython' and \
+            ZIP_RAW_COPY_VERSIONS[0] <= version_info[:2] <= ZIP_RAW_COPY_VERSIONS[1] and \
+            all(hasattr(final_zip_file, name) for name in ('fp', 'filelist', 'NameToInfo', 'start_dir'))
+
+    def copy_zip_info(info, compress_type: int):
+        """
+        New ZipInfo with the name, date, attributes and comment of info, for writing the member again
+        """
+        final_info = ZipInfo(info.filename, info.date_time)
+        final_info.compress_type = compress_type
+        final_info.create_system = info.create_system
+        final_info.external_attr = info.external_attr
+        final_info.comment = info.comment
+        return final_info
+
+    def copy_zip_member(file, info, final_zip_file) -> None:
+        """
+        Copies the member of the zip file as it is (local header, compressed data and data descriptor) to the end of final_zip_file
+        Only if zip_raw_copy_supported
+        """
+        file.seek(info.header_offset)
+        header = file.read(30)
+        if header[:4] != b'PK\x03\x04':
+            raise Exception(f'pyRitoFile: Failed: Copy zip member: {info.filename}: Wrong local header signature.')
+        name_length, extra_length = unpack('<HH', header[26:30])
+        name_extra = file.read(name_length + extra_length)
+        length = 30 + name_length + extra_length + info.compress_size
+        if info.flag_bits & 0x08:
+            # data descriptor after the data, with an optional signature and 8 bytes sizes for zip64
+            file.seek(info.header_offset + length)
+            extra, zip64 = name_extra[name_length:], False
+            while len(extra) >= 4:
+                extra_id, extra_size = unpack('<HH', extra[:4])
+                zip64 = zip64 or extra_id == 0x0001
+                extra = extra[4 + extra_size:]
+            descriptor_length = 16 if zip64 else 8
+            length += descriptor_length + (8 if file.read(4) == b'PK\x07\x08' else 4)
+        final_info = copy(info)
+        final_info.header_offset = final_zip_file.fp.tell()
+        file.seek(info.header_offset)
+        while length > 0:
+            block = file.read(min(length, 1024 * 1024))
+            if not block:
+                raise Exception(f'pyRitoFile: Failed: Copy zip member: {info.filename}: Unexpected end of file.')
+            final_zip_file.fp.write(block)
+            length -= len(block)
+        # the central directory is written on close from the filelist
+        final_zip_file.filelist.append(final_info)
+        final_zip_file.NameToInfo[final_info.filename] = final_info
+        final_zip_file.start_dir = final_zip_file.fp.tell()
+
+    def rewrite_zip(zip_file, file, zip_path: str, members: dict) -> None:
+        """
+        Writes the zip file to zip_path with the data of the members replaced and deflated,
+        the other members are copied without decompressing them (see zip_raw_copy_supported)
+        """
+        with ZipFile(zip_path, 'w', ZIP_DEFLATED, True) as final_zip_file:
+            final_zip_file.comment = zip_file.comment
+            raw_copy = zip_raw_copy_supported(final_zip_file)
             for info in zip_file.infolist():
-                if not info.is_dir():
-                    if info.filename.lower().endswith('.bin'):
-                        bins_dict[info.filename] = zip_file.read(info)
-                        has_bin_files_flag = True
+                if info.filename in members:
+                    final_zip_file.writestr(copy_zip_info(info, ZIP_DEFLATED), members[info.filename])
+                elif raw_copy:
+                    copy_zip_member(file, info, final_zip_file)
+                else:
+                    with zip_file.open(info) as member, final_zip_file.open(copy_zip_info(info, info.compress_type), 'w') as final_member:
+                        copyfileobj(member, final_member, 1024 * 1024)
+
+    def parse_fantome(fantome_path: str) -> list:
+        """
+        Fixes the bins and wads inside the fantome, returns the changes as ("fantome path/member name", parse_bin change)
+        """
+        changes = []
+        with open(fantome_path, 'rb') as file:
+            zip_file = ZipFile(file, 'r')
+            zip_infos = [info for info in zip_file.infolist() if not info.is_dir()]
+            bin_infos = [info for info in zip_infos if info.filename.lower().endswith('.bin')]
+            wad_infos = [info for info in zip_infos if info.filename.lower().endswith('.wad.client')]
 
-            if not has_bin_files_flag:
+            if len(bin_infos) == 0:
                 # checking for .wad.client files if doesnt havae bin files inside
-                if not any(x.lower().endswith('info.json') for x in zip_name_list) or \
-                not any(x.lower().endswith('.wad.client') for x in zip_name_list):
+                if not any(info.filename.lower().endswith('info.json') for info in zip_infos) or len(wad_infos) == 0:
                     print("The Zip File does not contains info.json or .wad.client files (it isn't a fantome)")
-                    return
-            
-            wads_dict, final_wads_dict, extra_infos = {}, {}, {}  # "Path/To/Wad.wad" = WadBytes
-            
-            for name in zip_name_list:
-                if name.lower().endswith('.wad.client'):
-                    with zip_file.open(name, 'r') as f:
-                        wads_dict[name] = f.read()
-                else:
-                    if name.lower().endswith('.bin'):
-                        continue
-                    with zip_file.open(name, 'r') as f:
-                        extra_infos[name] = f.read()
-        
-        for bin_path, bin_byte in bins_dict.items():
-            try:
-                bin_file = BIN()
-                bin_file.read(path='', raw=bin_byte)
-                bin_file = parse_bin(bin_file)
-                final_bins_dict[bin_path] = bin_file.write(path='', raw=True)
-            except Exception:
-                print(f"Bin File: {bin_path} THROWN AN EXCEPTION")
-
-        for wad_name, wad_byte in wads_dict.items():
-            wad = WAD()
-            wad.read(path='blank-path', raw=wad_byte)
-            chunk_datas = []
-            chunk_hashes = []
-            with wad.stream(path='', mode='', raw=wad_byte) as bs:
-                for chunk in wad.chunks:
-                    chunk.read_data(bs)
-                    if chunk.extension == 'bin':
-                        try:
-                            bin_file = BIN()
-                            bin_file.read(path='', raw=chunk.data)
-                            bin_file = parse_bin(bin_file)
-                            chunk.data = bin_file.write(path='', raw=True)
-                        except Exception:
-                            print(f'File Hash: "{chunk.hash}" THROWN AN EXCEPTION')
-                    chunk_datas.append(chunk.data)
-                    chunk_hashes.append(chunk.hash)
-            
-            wad = WAD()
-            wad.chunks = [WADChunk.default() for _ in range(len(chunk_hashes))]
-            
-            with wad.stream('', 'rb+', raw=wad.write('', raw=True)) as bs:
-                for id, chunk in enumerate(wad.chunks):
-                    chunk.write_data(bs, id, chunk_hashes[id], chunk_datas[id], previous_chunks=(
-                                        wad.chunks[i] for i in range(id)))
-                    chunk.free_data()
-                        
-                final_wads_dict[wad_name] = bs.raw()
-
-        final_zip_buffer = BytesIO()
-        final_zip_file = ZipFile(final_zip_buffer, 'w', ZIP_DEFLATED, False)
-
-        for final_wad_name, final_wad_bytes in final_wads_dict.items():
-            final_zip_file.writestr(final_wad_name, final_wad_bytes)
-        for extra_name, extra_byte in extra_infos.items():
-            final_zip_file.writestr(extra_name, extra_byte)
-        for final_bin_name, final_bin_byte in final_bins_dict.items():
-            final_zip_file.writestr(final_bin_name, final_bin_byte)
-
-        zip_file.close()
-        final_zip_file.close()
-
-        with open(fantome_path, 'wb') as file:
+                    return changes
+
+            # only the fixed members are kept, "Path/To/Wad.wad" = WadBytes
+            fixed_members = {}
+            for info in bin_infos:
+                try:
+                    fixed_byte, bin_changes = fix_bin(zip_file.read(info))
+                except Exception:
+                    print(f"Bin File: {info.filename} THROWN AN EXCEPTION")
+                    continue
+                if fixed_byte != None:
+                    fixed_members[info.filename] = fixed_byte
+                    changes += [(f'{fantome_path}/{info.filename}', change) for change in bin_changes]
+
+            for info in wad_infos:
+                wad_byte = zip_file.read(info)
+                wad = WAD()
+                wad.read(path='blank-path', raw=wad_byte)
+                with wad.stream(path='', mode='', raw=wad_byte) as bs:
+                    fixed_chunks, wad_changes = fix_wad_chunks(wad, bs, info.filename)
+                    changes += [(f'{fantome_path}/{where}', change) for where, change in wad_changes]
+                    if fixed_chunks:
+                        fixed_members[info.filename] = rebuild_wad(wad, bs, fixed_chunks)
+                del wad_byte
+
+            if len(fixed_members) == 0:
+                zip_file.close()
+                print(f"Nothing to fix in Fantome: {fantome_path}")
+                return changes
+
             print(f"Writing Fantome: {fantome_path}")
-            file.write(final_zip_buffer.getvalue())
-            
+            temp_path = fantome_path + '.tmp'
+            try:
+                rewrite_zip(zip_file, file, temp_path, fixed_members)
+            except:
+                remove(temp_path)
+                raise
+            zip_file.close()
+        replace(temp_path, fantome_path)
+        return changes
 
-    if path.isfile(inpt) and inpt.endswith('.bin'):
-        # User are using a .bin file
+    def fix_file(file_path: str) -> tuple:
+        """
+        Fixes one file of the folder mode, returns (file path, printed log, exception, fingerprint of the fixed file, changes)
+        """
+        log = StringIO()
         try:
-            bin_file = BIN()
-            bin_file.read(inpt)
-            parse_bin(bin_file)
-            print("Writing .bin file :D")
-            bin_file.write(inpt)
-            print("End of Script.")
+            with redirect_stdout(log):
+                if file_path.lower().endswith('.bin'):
+                    print(f"Parsing Bin: {file_path}...")
+                    changes = parse_bin_file(file_path)
+                elif file_path.lower().endswith('.wad.client'):
+                    print(f"Parsing Wad: {file_path}...")
+                    changes = parse_wad(file_path)
+                else:
+                    print(f"Parsing Fantome: {file_path}")
+                    changes = parse_fantome(file_path)
+            fingerprint = file_fingerprint(file_path)
         except Exception as e:
-            print(e, '\nSomething went wrong lol uwu')
-            input()
+            return file_path, log.getvalue(), e, None, []
+        finally:
+            # the pool processes dont run atexit
+            flush_bin_cache()
+        return file_path, log.getvalue(), None, fingerprint, changes
 
-    elif path.isfile(inpt) and inpt.endswith('.wad.client'):
-        # User are using a .wad file
-        try:
-            print(f"Parsing Wad: {inpt}...")
-            wad_bytes = parse_wad(inpt)
-            print("Writing .wad file :D")
-            with open(inpt, 'wb') as f:
-                f.write(wad_bytes)
-        except Exception as e:
-            print(e, '\nSomething went wrong lol uwu')
-            input()
+    def fix_files_init():
+        """
+        The processes fix one file each, so no threads inside them
+        """
+        global WAD_WORKERS
+        WAD_WORKERS = 1
+
+    def fix_files(file_paths: list, on_result=None) -> list:
+        """
+        Fixes the files on DIR_WORKERS processes, biggest first, printing the log of each file when its done
+        on_result is called with each fix_file result when its done
+        Returns the fix_file results
+        """
+        sizes = {file_path: path.getsize(file_path) for file_path in file_paths}
+        queue = deque(sorted(file_paths, key=sizes.get, reverse=True))
+        results = []
+        if DIR_WORKERS <= 1:
+            for file_path in queue:
+                results.append(fix_file(file_path))
+                print(results[-1][1], end='')
+                if on_result != None:
+                    on_result(results[-1])
+            return results
 
-    elif path.isfile(inpt) and (inpt.endswith('.zip') or inpt.endswith('.fantome')):
-        # User are using a fantome
+        executor = ProcessPoolExecutor(DIR_WORKERS, initializer=fix_files_init)
         try:
-            print(f"Parsing Fantome: {inpt}")
-            parse_fantome(inpt)
-            print("End of Script.")
-        except Exception as e:
-            print(e, '\nSomething went wrong lol uwu')
-            input()
+            pending = {}
+            pending_bytes = 0
+            while queue or pending:
+                # always run one file even if its bigger than DIR_MAX_BYTES
+                while queue and len(pending) < DIR_WORKERS and (not pending or pending_bytes + sizes[queue[0]] <= DIR_MAX_BYTES):
+                    file_path = queue.popleft()
+                    pending[executor.submit(fix_file, file_path)] = file_path
+                    pending_bytes += sizes[file_path]
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                broken = False
+                for future in done:
+                    file_path = pending.pop(future)
+                    pending_bytes -= sizes[file_path]
+                    try:
+                        results.append(future.result())
+                    except Exception as e:
+                        # the process died (like out of memory) or its result couldnt be sent back
+                        results.append((file_path, '', e, None, []))
+                        broken = broken or isinstance(e, BrokenProcessPool)
+                    print(results[-1][1], end='')
+                    if on_result != None:
+                        on_result(results[-1])
+                if broken:
+                    # the files in flight fail with it too, the next ones get new processes
+                    executor.shutdown(wait=False)
+                    executor = ProcessPoolExecutor(DIR_WORKERS, initializer=fix_files_init)
+        finally:
+            executor.shutdown(cancel_futures=True)
+        return results
 
-    elif path.isdir(inpt):
-        # User are using a dir
-        from os import walk
-        found_bins = []
-        found_wads = []
-        found_fantomes = []
-        print("Searching for Wads and Bins and Fantomes/Zips inside the desired folder.")
-        
-        for root, dirs, files in walk(inpt):
-            for file in files:
-                if file.lower().endswith('.bin'):
-                    found_bins.append(path.join(root, file))
-                elif file.lower().endswith('.wad.client'):
-                    found_wads.append(path.join(root, file))
-                elif file.lower().endswith('.fantome') or file.lower().endswith('.zip'):
-                    found_fantomes.append(path.join(root, file))
-        print(f'"Bins": {found_bins}\n"Wads": {found_wads}\n"Fantomes": {found_fantomes}\n')
-       
-        for bin_path in found_bins:
-            try:
-                print(f"Parsing Bin: {bin_path}...")
-                bin_file = BIN()
-                bin_file.read(bin_path)
-                parse_bin(bin_file)
-                print("Writing .bin file :D")
-                bin_file.write(bin_path)
-            except Exception:
-                print(f"{bin_path} THROWN AN EXCEPTION")
-        
-        for wad_path in found_wads:
+    if __name__ == '__main__':
+        freeze_support()
+        atexit.register(flush_bin_cache)
+        if len(argv) != 2:
+            input('Make sure to drag and drop something into the .exe!')
+            exit()
+
+        inpt = argv[1].lower()
+
+        if path.isfile(inpt) and inpt.endswith('.bin'):
+            # User are using a .bin file
             try:
-                print(f"Parsing Wad: {wad_path}...")
-                wad_bytes = parse_wad(wad_path)
-                print("Writing .wad file :D")
-                with open(wad_path, 'wb') as f:
-                    f.write(wad_bytes)
-            except Exception:
-                print(f"{wad_path} THROWN AN EXCEPTION")
+                for change in parse_bin_file(inpt):
+                    print(format_change(*change))
+                print("End of Script.")
+            except Exception as e:
+                print(e, '\nSomething went wrong lol uwu')
+                input()
 
-        for fantome_path in found_fantomes:
+        elif path.isfile(inpt) and inpt.endswith('.wad.client'):
+            # User are using a .wad file
             try:
-                print(f"Parsing Fantome: {fantome_path}")
-                parse_fantome(fantome_path)
-            except Exception:
-                print(f"{fantome_path} THROWN AN EXCEPTION")
+                print(f"Parsing Wad: {inpt}...")
+                for change in parse_wad(inpt):
+                    print(format_change(*change))
+            except Exception as e:
+                print(e, '\nSomething went wrong lol uwu')
+                input()
 
-        print("End of Script.")
+        elif path.isfile(inpt) and (inpt.endswith('.zip') or inpt.endswith('.fantome')):
+            # User are using a fantome
+            try:
+                print(f"Parsing Fantome: {inpt}")
+                for change in parse_fantome(inpt):
+                    print(format_change(*change))
+                print("End of Script.")
+            except Exception as e:
+                print(e, '\nSomething went wrong lol uwu')
+                input()
 
-    else:
-        print("Couldn't guess the desired object to fix uwu")
-        input()
+        elif path.isdir(inpt):
+            # User are using a dir
+            from os import walk
+            found_bins = []
+            found_wads = []
+            found_fantomes = []
+            print("Searching for Wads and Bins and Fantomes/Zips inside the desired folder.")
         
+            for root, dirs, files in walk(inpt):
+                for file in files:
+                    if file.lower().endswith('.bin'):
+                        found_bins.append(path.join(root, file))
+                    elif file.lower().endswith('.wad.client'):
+                        found_wads.append(path.join(root, file))
+                    elif file.lower().endswith('.fantome') or file.lower().endswith('.zip'):
+                        found_fantomes.append(path.join(root, file))
+            print(f'"Bins": {found_bins}\n"Wads": {found_wads}\n"Fantomes": {found_fantomes}\n')
+       
+            file_paths = found_bins + found_wads + found_fantomes
+            manifest = None
+            if DIR_MANIFEST != None:
+                manifest = FILE_MANIFEST(inpt)
+                file_paths = manifest.changed(file_paths)
+                print(f"Skipping {len(found_bins) + len(found_wads) + len(found_fantomes) - len(file_paths)} files fixed before.")
+            results = fix_files(file_paths, manifest.add_result if manifest != None else None)
+            if manifest != None:
+                manifest.close()
+            failed = [(file_path, exception) for file_path, log, exception, fingerprint, changes in results if exception != None]
+            changes = [change for file_path, log, exception, fingerprint, file_changes in results for change in file_changes]
+            print(f"Fixed {len(results) - len(failed)} files with {len(changes)} changes, {len(failed)} failed.")
+            for change in changes:
+                print(format_change(*change))
+            for file_path, exception in failed:
+                print(f"{file_path}: {exception!r}")
+
+            print("End of Script.")
+
+        else:
+            print("Couldn't guess the desired object to fix uwu")
+            input()
+
 except Exception as e:
     print(e)
     print("\n something went wrong owo")